@@ -0,0 +1,225 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Buckets of the per-student correct-rate histogram
+RATE_BINS = np.linspace(0.0, 1.0, 11)
+
+EPOCH = datetime(1970, 1, 1)
+MILLISECOND = timedelta(milliseconds=1)
+
+
+class ClassHistory:
+    """A class's assessments as parallel NumPy arrays in date order.
+
+    Students are factorized to dense integer codes; ``student_ids[code]``
+    maps a code back to the student id.
+    """
+
+    __slots__ = ("student_ids", "codes", "dates", "scores")
+
+    def __init__(self, student_ids: List[str], codes: np.ndarray, dates: np.ndarray, scores: np.ndarray):
+        self.student_ids = student_ids
+        self.codes = codes
+        self.dates = dates
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, List[Any]]) -> "ClassHistory":
+        ids = columns["student_id"]
+        index: Dict[str, int] = {}
+        codes = np.fromiter((index.setdefault(student_id, len(index)) for student_id in ids),
+                            dtype=np.int32, count=len(ids))
+        # Integer milliseconds are an order of magnitude faster to build than
+        # letting NumPy convert datetime objects
+        dates = np.fromiter(((date - EPOCH) // MILLISECOND for date in columns["date"]),
+                            dtype=np.int64, count=len(ids)).view("datetime64[ms]")
+        scores = np.asarray(columns["score"], dtype=np.int8)
+        if len(dates) > 1 and (dates[1:] < dates[:-1]).any():
+            order = np.argsort(dates, kind="stable")
+            codes, dates, scores = codes[order], dates[order], scores[order]
+        return cls(list(index), codes, dates, scores)
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1), 0.0)
+
+
+def _gini(values: np.ndarray) -> float:
+    # 0 when every student was picked equally often, towards 1 when a few
+    # students take all the picks
+    if len(values) == 0 or values.sum() == 0:
+        return 0.0
+    values = np.sort(values)
+    n = len(values)
+    ranks = np.arange(1, n + 1)
+    return float((2 * (ranks * values).sum()) / (n * values.sum()) - (n + 1) / n)
+
+
+def _daily(history: ClassHistory, window_days: int) -> List[Dict[str, Any]]:
+    days = history.dates.astype("datetime64[D]")
+    offsets = (days - days[0]).astype(np.int64)
+    n_days = int(offsets[-1]) + 1
+    counts = np.bincount(offsets, minlength=n_days)
+    correct = np.bincount(offsets, weights=history.scores == 1, minlength=n_days)
+
+    # Rolling sums over the trailing calendar window from prefix sums
+    count_sums = np.concatenate(([0], np.cumsum(counts)))
+    correct_sums = np.concatenate(([0.0], np.cumsum(correct)))
+    upper = np.arange(1, n_days + 1)
+    lower = np.maximum(upper - window_days, 0)
+    rolling = _ratio(correct_sums[upper] - correct_sums[lower], count_sums[upper] - count_sums[lower])
+
+    active = np.flatnonzero(counts)
+    accuracy = _ratio(correct[active], counts[active])
+    labels = (days[0] + active).astype(str).tolist()
+    return [
+        {
+            "date": label,
+            "assessments": assessments,
+            "correct": int(day_correct),
+            "accuracy": round(day_accuracy, 4),
+            "rolling_accuracy": round(day_rolling, 4),
+        }
+        for label, assessments, day_correct, day_accuracy, day_rolling in zip(
+            labels, counts[active].tolist(), correct[active].tolist(),
+            accuracy.tolist(), rolling[active].tolist()
+        )
+    ]
+
+
+def participation_metrics(history: ClassHistory, roster: List[Dict[str, Any]],
+                          window_days: int = 7, recent: int = 10) -> Dict[str, Any]:
+    """Per-student and class-wide participation metrics, computed column-wise.
+
+    ``picks_since_last`` counts the class assessments since the student was
+    last assessed, ``mean_picks_between`` the average number of other
+    assessments between two of theirs, and ``recent_accuracy`` the correct
+    rate over their last ``recent`` answers. Streaks count consecutive
+    answers with the same result.
+    """
+    n = len(history)
+    k = len(history.student_ids)
+    codes, scores = history.codes, history.scores
+    is_correct = scores == 1
+
+    totals = np.bincount(codes, minlength=k)
+    correct = np.bincount(codes, weights=is_correct, minlength=k).astype(np.int64)
+    wrong = np.bincount(codes, weights=scores == 0, minlength=k).astype(np.int64)
+    rates = _ratio(correct, totals)
+
+    # Group each student's assessments together, keeping date order within
+    # a student; order[i] is the chronological position of grouped row i
+    order = np.argsort(codes, kind="stable")
+    grouped = codes[order]
+    grouped_scores = scores[order]
+    starts = np.concatenate(([0], np.cumsum(totals)[:-1])).astype(np.int64)
+    last_index = order[starts + totals - 1] if k else np.zeros(0, dtype=np.int64)
+    picks_since_last = n - 1 - last_index
+    last_dates = history.dates[last_index]
+
+    same_student = grouped[1:] == grouped[:-1]
+    gaps = np.bincount(grouped[1:][same_student], weights=np.diff(order)[same_student] - 1, minlength=k)
+    mean_gaps = _ratio(gaps, totals - 1)
+
+    # Answers counted from each student's most recent one
+    from_end = totals[grouped] - (np.arange(n) - starts[grouped])
+    in_recent = from_end <= recent
+    recent_totals = np.bincount(grouped[in_recent], minlength=k)
+    recent_correct = np.bincount(grouped[in_recent], weights=grouped_scores[in_recent] == 1, minlength=k)
+    recent_accuracy = _ratio(recent_correct, recent_totals)
+
+    # Run-length encode each student's answers into streaks
+    new_run = np.ones(n, dtype=bool)
+    new_run[1:] = ~same_student | (grouped_scores[1:] != grouped_scores[:-1])
+    run_starts = np.flatnonzero(new_run)
+    run_lengths = np.diff(np.append(run_starts, n))
+    run_codes = grouped[run_starts]
+    run_correct = grouped_scores[run_starts] == 1
+    longest_correct = np.zeros(k, dtype=np.int64)
+    longest_wrong = np.zeros(k, dtype=np.int64)
+    np.maximum.at(longest_correct, run_codes[run_correct], run_lengths[run_correct])
+    np.maximum.at(longest_wrong, run_codes[~run_correct], run_lengths[~run_correct])
+    last_run = np.ones(len(run_starts), dtype=bool)
+    last_run[:-1] = run_codes[1:] != run_codes[:-1]
+    current_streak = np.zeros(k, dtype=np.int64)
+    current_correct = np.zeros(k, dtype=bool)
+    current_streak[run_codes[last_run]] = run_lengths[last_run]
+    current_correct[run_codes[last_run]] = run_correct[last_run]
+
+    columns = {
+        "total": totals.tolist(),
+        "correct": correct.tolist(),
+        "wrong": wrong.tolist(),
+        "correct_rate": np.round(rates, 4).tolist(),
+        "recent_accuracy": np.round(recent_accuracy, 4).tolist(),
+        "last_assessed": last_dates.tolist(),
+        "picks_since_last": picks_since_last.tolist(),
+        "mean_picks_between": np.round(mean_gaps, 2).tolist(),
+        "current_streak": current_streak.tolist(),
+        "current_streak_correct": current_correct.tolist(),
+        "longest_correct_streak": longest_correct.tolist(),
+        "longest_wrong_streak": longest_wrong.tolist(),
+    }
+
+    index = {student_id: code for code, student_id in enumerate(history.student_ids)}
+    students = []
+    roster_ids = set()
+    for student in roster:
+        roster_ids.add(student["id"])
+        students.append(_student_row(student["id"], student, index.get(student["id"]), columns, totals))
+    # Assessed students no longer on the roster
+    for code, student_id in enumerate(history.student_ids):
+        if student_id not in roster_ids:
+            students.append(_student_row(student_id, {}, code, columns, totals))
+    students.sort(key=lambda row: row["student_number"] or "")
+
+    roster_totals = np.array([row["total"] for row in students], dtype=np.int64)
+    histogram, _ = np.histogram(rates, bins=RATE_BINS)
+    return {
+        "assessments": n,
+        "students_total": len(students),
+        "assessed_students": k,
+        "never_assessed": int((roster_totals == 0).sum()),
+        "correct_answers": int(is_correct.sum()),
+        "wrong_answers": int((scores == 0).sum()),
+        "correct_rate": round(float(is_correct.mean()), 4) if n else 0.0,
+        "first_assessment": history.dates[0].tolist() if n else None,
+        "last_assessment": history.dates[-1].tolist() if n else None,
+        "participation": {
+            "mean": round(float(roster_totals.mean()), 2) if len(roster_totals) else 0.0,
+            "std": round(float(roster_totals.std()), 2) if len(roster_totals) else 0.0,
+            "min": int(roster_totals.min()) if len(roster_totals) else 0,
+            "max": int(roster_totals.max()) if len(roster_totals) else 0,
+            "gini": round(_gini(roster_totals), 4),
+        },
+        "correct_rate_distribution": [
+            {"from": round(float(low), 1), "to": round(float(high), 1), "students": int(count)}
+            for low, high, count in zip(RATE_BINS[:-1], RATE_BINS[1:], histogram)
+        ],
+        "students": students,
+        "daily": _daily(history, window_days) if n else [],
+    }
+
+
+def _student_row(student_id: str, student: Dict[str, Any], code: Optional[int],
+                 columns: Dict[str, List[Any]], totals: np.ndarray) -> Dict[str, Any]:
+    row = {
+        "student_id": student_id,
+        "student_name": student.get("name"),
+        "student_number": student.get("student_number"),
+    }
+    if code is None:
+        row.update({name: None for name in columns})
+        row.update({"total": 0, "correct": 0, "wrong": 0, "current_streak": 0,
+                    "longest_correct_streak": 0, "longest_wrong_streak": 0})
+        return row
+    row.update({name: values[code] for name, values in columns.items()})
+    if totals[code] < 2:
+        row["mean_picks_between"] = None
+    return row
@@ -0,0 +1,66 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+async def call_asgi(app, method: str, path: str, query_string: bytes, headers: List[Tuple[bytes, bytes]],
+                    body: bytes = b"", client: Optional[Tuple[str, int]] = None,
+                    server: Optional[Tuple[str, int]] = None) -> Tuple[int, Dict[str, str], bytes]:
+    """Run one HTTP request through an ASGI app in-process.
+
+    Returns the status code, the response headers and the full body.
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "root_path": "",
+        "query_string": query_string,
+        "headers": headers,
+        "client": client,
+        "server": server,
+    }
+    delivered = False
+    finished = asyncio.Event()
+    status_code = 500
+    response_headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Nobody disconnects an in-process request before it is answered
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+            response_headers.update(
+                (name.decode("latin-1"), value.decode("latin-1")) for name, value in message.get("headers", [])
+            )
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return status_code, response_headers, b"".join(chunks)
+
+
+def decode_body(headers: Dict[str, str], body: bytes) -> Any:
+    if not body:
+        return None
+    if headers.get("content-type", "").startswith("application/json"):
+        return json.loads(body)
+    return body.decode("utf-8", errors="replace")
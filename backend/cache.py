@@ -0,0 +1,98 @@
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+
+class RevisionTracker:
+    """Monotonic revision counters per scope, e.g. ("class", class_id).
+
+    Mutating handlers bump the scope they touch; cache keys embed the revision
+    that was current when the value was loaded, so a bump makes every older
+    entry unreachable immediately.
+    """
+
+    def __init__(self):
+        self._revisions: Dict[Hashable, int] = {}
+        # Revision of scopes never bumped individually
+        self._base = 0
+
+    def get(self, scope: Hashable) -> int:
+        return self._revisions.get(scope, self._base)
+
+    def bump(self, scope: Hashable) -> int:
+        revision = self.get(scope) + 1
+        self._revisions[scope] = revision
+        return revision
+
+    def bump_all(self):
+        self._base += 1
+        for scope in self._revisions:
+            self._revisions[scope] += 1
+
+
+class VersionedCache:
+    """Bounded LRU cache with hit, miss and eviction counters.
+
+    Entries put with a scope are dropped together by evict_scope when the
+    scope's revision moves on, rather than waiting for LRU to reach them.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._scopes: Dict[Hashable, Set[Hashable]] = defaultdict(set)
+        self._key_scopes: Dict[Hashable, Hashable] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def put(self, key: Hashable, value: Any, scope: Optional[Hashable] = None):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if scope is not None:
+            self._scopes[scope].add(key)
+            self._key_scopes[key] = scope
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._forget(evicted)
+            self.evictions += 1
+
+    def _forget(self, key: Hashable):
+        scope = self._key_scopes.pop(key, None)
+        if scope is not None:
+            keys = self._scopes[scope]
+            keys.discard(key)
+            if not keys:
+                del self._scopes[scope]
+
+    def evict_scope(self, scope: Hashable):
+        for key in self._scopes.pop(scope, ()):
+            del self._entries[key]
+            del self._key_scopes[key]
+            self.invalidations += 1
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._scopes.clear()
+        self._key_scopes.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the number of changes returned by one sync call
+CHANGES_PAGE_SIZE = 5000
+
+# A worker's lease lapses when it is not renewed for this long, so a crashed
+# worker stops holding back the sync tokens of the others
+LEASE_SECONDS = 60
+
+
+class ChangesExpired(Exception):
+    """The sync token is older than the retained part of the log."""
+
+
+class ChangeLog:
+    """Append-only log of student and assessment changes per class.
+
+    Every entry carries a sequence number from a single monotonically
+    increasing counter, which clients use as their sync token. A reset entry
+    marks that the class was cleared; everything logged before it is
+    compacted away. Entries are kept by the storage repository and trimmed
+    once they are older than the retention period; tokens below the trimmed
+    range raise ChangesExpired.
+
+    Workers share the counter, so one may write seq N+1 while another still
+    holds N. Before allocating, a worker stores a lease with the lowest
+    number it may still write, and sync tokens never pass the lowest live
+    lease. Once an entry is written the lease is moved up, or dropped when
+    nothing else is in flight, before record() returns, so a client sees its
+    own change in the next sync. Writes that arrive while the counter is
+    being incremented share the next increment, so a burst of writes does
+    not queue on the counter for every entry, and no number is handed out
+    without being written.
+    """
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Sequence ranges allocated by this process whose log entries are not
+        # written yet
+        self._pending: Dict[int, int] = {}
+        self._allocating = 0
+        self._known_seq = 0
+        self._leased = False
+        self._lease_lock = asyncio.Lock()
+        # Bumped whenever an entry lands; the stored lease reflects
+        # everything up to _published
+        self._version = 0
+        self._published = 0
+        self._renewer: Optional[asyncio.Task] = None
+        # Allocations waiting for the next counter increment
+        self._requests: List[tuple] = []
+        self._reserving: Optional[asyncio.Task] = None
+
+    def _lease_expiry(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)
+
+    async def _allocate(self, store, count: int) -> int:
+        self._allocating += 1
+        try:
+            if not self._leased:
+                async with self._lease_lock:
+                    if not self._leased:
+                        # Every number the counter hands out next is above
+                        # what this process has seen of it
+                        await store.set_change_lease(self.owner, self._known_seq + 1, self._lease_expiry())
+                        self._leased = True
+                        if self._renewer is None:
+                            self._renewer = asyncio.create_task(self._renew(store))
+            first = await self._reserve(store, count)
+            self._pending[first] = first + count - 1
+            return first
+        finally:
+            self._allocating -= 1
+
+    async def _reserve(self, store, count: int) -> int:
+        future = asyncio.get_running_loop().create_future()
+        self._requests.append((count, future))
+        if self._reserving is None or self._reserving.done():
+            self._reserving = asyncio.create_task(self._reserve_requests(store))
+        return await future
+
+    async def _reserve_requests(self, store):
+        while self._requests:
+            requests, self._requests = self._requests, []
+            total = sum(count for count, _ in requests)
+            try:
+                last = await store.allocate_seq(total)
+            except Exception as error:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self._known_seq = max(self._known_seq, last)
+            first = last - total + 1
+            for count, future in requests:
+                if not future.done():
+                    future.set_result(first)
+                first += count
+
+    def _low(self) -> int:
+        # Lowest number this process may still write
+        return min(self._pending, default=self._known_seq + 1)
+
+    async def _publish(self, store):
+        # Caller holds _lease_lock
+        if self._pending or self._allocating:
+            await store.set_change_lease(self.owner, self._low(), self._lease_expiry())
+        else:
+            # Cleared first so an allocation starting meanwhile waits for
+            # the lock and stores a fresh lease
+            self._leased = False
+            await store.drop_change_lease(self.owner)
+
+    async def _written(self, store, first: int):
+        del self._pending[first]
+        self._version += 1
+        version = self._version
+        try:
+            async with self._lease_lock:
+                # A writer that queued behind the lock is covered by the
+                # update made by the one ahead of it
+                if not self._leased or self._published >= version:
+                    return
+                published = self._version
+                await self._publish(store)
+                self._published = published
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The entry is stored; the renewal retries the lease
+            logger.warning("Could not update the change log lease", exc_info=True)
+
+    async def _renew(self, store):
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            try:
+                async with self._lease_lock:
+                    if not self._leased:
+                        self._renewer = None
+                        return
+                    published = self._version
+                    await self._publish(store)
+                    self._published = published
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Could not renew the change log lease", exc_info=True)
+
+    async def close(self, store):
+        if self._renewer is not None:
+            self._renewer.cancel()
+            self._renewer = None
+        if self._leased and not self._pending:
+            self._leased = False
+            await store.drop_change_lease(self.owner)
+
+    async def _bounds(self, store):
+        floor, watermark = await store.change_bounds(datetime.utcnow())
+        return floor, min(watermark, self.watermark())
+
+    async def token(self, store) -> int:
+        """Sync token covering every entry written so far."""
+        return (await self._bounds(store))[1]
+
+    async def trim(self, store, before: datetime):
+        await store.trim_changes(before)
+
+    async def record(self, store, class_id: str, entity: str, op: str, docs: List[Dict[str, Any]]):
+        if not docs:
+            return
+        first = await self._allocate(store, len(docs))
+        try:
+            now = datetime.utcnow()
+            await store.append_changes([
+                {
+                    "seq": first + offset,
+                    "class_id": class_id,
+                    "entity": entity,
+                    "op": op,
+                    "entity_id": doc["id"],
+                    "doc": doc if op in ("created", "updated") else None,
+                    "at": now,
+                }
+                for offset, doc in enumerate(docs)
+            ])
+        finally:
+            await self._written(store, first)
+
+    async def reset(self, store, class_id: str):
+        seq = await self._allocate(store, 1)
+        try:
+            await store.append_changes([{
+                "seq": seq,
+                "class_id": class_id,
+                "entity": "class",
+                "op": "reset",
+                "entity_id": class_id,
+                "doc": None,
+                "at": datetime.utcnow(),
+            }])
+        finally:
+            await self._written(store, seq)
+        await store.delete_changes(class_id, before_seq=seq)
+
+    async def purge(self, store, class_id: str):
+        await store.delete_changes(class_id)
+
+    def watermark(self) -> float:
+        return min(self._pending) - 1 if self._pending else float("inf")
+
+    async def since(self, store, class_id: str, since: int) -> Dict[str, Any]:
+        # Read before the entries: anything at or below it is written already
+        floor, watermark = await self._bounds(store)
+        if since < floor:
+            raise ChangesExpired(floor)
+        fetched = await store.list_changes(class_id, since, CHANGES_PAGE_SIZE)
+        entries = [entry for entry in fetched if entry["seq"] <= watermark]
+
+        # Only changes after the most recent reset matter to the client
+        last_reset = max((i for i, entry in enumerate(entries) if entry["op"] == "reset"), default=None)
+        reset = last_reset is not None
+        applied = entries[last_reset + 1:] if reset else entries
+
+        result = {
+            "token": entries[-1]["seq"] if entries else since,
+            "reset": reset,
+            "has_more": len(fetched) == CHANGES_PAGE_SIZE,
+            "students": {"created": [], "updated": [], "deleted": []},
+            "assessments": {"created": [], "updated": [], "deleted": []},
+        }
+        for entry in applied:
+            bucket = result[entry["entity"] + "s"]
+            if entry["op"] in ("created", "updated"):
+                bucket[entry["op"]].append(entry["doc"])
+            else:
+                bucket["deleted"].append(entry["entity_id"])
+        return result
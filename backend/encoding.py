@@ -0,0 +1,127 @@
+import gzip
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from fastapi import Request, Response
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON = "application/json"
+MSGPACK = "application/x-msgpack"
+
+# Bodies smaller than this are not worth the CPU to compress
+MIN_COMPRESS_SIZE = 1024
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return msgpack.Timestamp.from_datetime(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def is_records(value: Any) -> bool:
+    return isinstance(value, list) and all(isinstance(row, dict) for row in value)
+
+
+def to_columns(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Columnar layout: every key is written once, and columns that hold the
+    # same value on every row (class_id, teacher_id, ...) collapse to a constant
+    names = list(dict.fromkeys(key for row in rows for key in row))
+    columns, constants = {}, {}
+    for name in names:
+        values = [row.get(name) for row in rows]
+        first = values[0]
+        if all(value == first for value in values):
+            constants[name] = first
+        else:
+            columns[name] = values
+    return {"length": len(rows), "columns": columns, "constants": constants}
+
+
+def columnar(content: Any) -> Any:
+    if is_records(content):
+        return to_columns(content)
+    if isinstance(content, dict):
+        return {key: to_columns(value) if is_records(value) else value for key, value in content.items()}
+    return content
+
+
+def qualities(header: str) -> Dict[str, float]:
+    """Values of an Accept-style header mapped to their q-value."""
+    result = {}
+    for item in (header or "").split(","):
+        value, *params = [part.strip() for part in item.split(";")]
+        if not value:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        result[value.lower()] = quality
+    return result
+
+
+def negotiate_media_type(accept: str) -> str:
+    accepted = qualities(accept)
+    preferred = accepted.get(MSGPACK, 0.0)
+    if msgpack is not None and preferred > 0 and preferred >= accepted.get(JSON, 0.0):
+        return MSGPACK
+    return JSON
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    accepted = qualities(accept_encoding)
+    fallback = accepted.get("*", 0.0)
+    # On equal q-values the earlier coding wins
+    codings = ["br", "gzip"] if brotli is not None else ["gzip"]
+    quality, coding = max(((accepted.get(coding, fallback), coding) for coding in codings), key=lambda pair: pair[0])
+    return coding if quality > 0 else None
+
+
+def encode_body(content: Any, media_type: str) -> bytes:
+    if media_type == MSGPACK:
+        return msgpack.packb(columnar(content), default=_msgpack_default)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def compress_body(body: bytes, content_encoding: str) -> bytes:
+    if content_encoding == "br":
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=5)
+
+
+def encode_response(request: Request, content: Any, status_code: int = 200) -> Response:
+    """Encode content in the representation the client asked for.
+
+    Supports JSON (default) and columnar MessagePack via ``Accept``, and
+    brotli/gzip compression via ``Accept-Encoding``, honouring q-values.
+    """
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    body = encode_body(content, media_type)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    content_encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if content_encoding and len(body) >= MIN_COMPRESS_SIZE:
+        body = compress_body(body, content_encoding)
+        headers["Content-Encoding"] = content_encoding
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+
+class GroupCommit:
+    """Coalesce single-item writes from concurrent requests into batch writes.
+
+    Items submitted within ``max_delay`` seconds of the first pending one,
+    up to ``max_batch`` items, are written with a single call to ``write``.
+    Each submitter waits until the batch holding its item is written and
+    receives the batch's exception if the write fails. ``write`` may instead
+    return one exception or None per item, so only the items that were not
+    written fail.
+    """
+
+    def __init__(self, write: Callable[[List[Any]], Awaitable[Optional[List[Optional[Exception]]]]],
+                 max_batch: int = 100, max_delay: float = 0.005):
+        self.write = write
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: Any):
+        if self._closed:
+            # Shutting down: nothing will flush a new batch any more
+            errors = await self.write([item])
+            if errors and errors[0] is not None:
+                raise errors[0]
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._write(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            errors = await self.write([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                # A cancelled submitter's item is still written, but nobody
+                # is waiting for the outcome
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for index, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if errors and errors[index] is not None:
+                    future.set_exception(errors[index])
+                else:
+                    future.set_result(None)
+
+    async def close(self):
+        """Write everything still pending and wait for writes in flight."""
+        self._closed = True
+        self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "pending": len(self._pending),
+            "average_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
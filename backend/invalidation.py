@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import Callable, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBus:
+    """Invalidation bus of a single process.
+
+    Revisions are bumped locally before an event is published, so with one
+    worker there is nobody else to tell.
+    """
+
+    name = "local"
+
+    async def start(self, on_event: Callable[[Hashable], None], on_reset: Callable[[], None]):
+        pass
+
+    def publish(self, scope: Hashable):
+        pass
+
+    def stats(self):
+        return {"bus": self.name}
+
+    async def close(self):
+        pass
+
+
+class RedisBus:
+    """Share revision bumps between workers over Redis pub/sub.
+
+    ``publish`` never waits: scopes are queued and sent by a background task,
+    several per message when writes come in faster than Redis answers. Other
+    workers bump the same scopes in their own RevisionTracker. Messages are
+    not persisted, so after losing the subscription a worker calls
+    ``on_reset`` to drop everything it may have missed.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, channel: str = "participation:invalidate", max_backoff: float = 10.0):
+        self.url = url
+        self.channel = channel
+        self.max_backoff = max_backoff
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.client = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.published = 0
+        self.received = 0
+        self.resets = 0
+        self.connected = False
+
+    async def start(self, on_event: Callable[[Hashable], None], on_reset: Callable[[], None]):
+        # Imported here so single-worker deployments do not need redis
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(self.url)
+        self._queue = asyncio.Queue()
+        subscribed = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._listen(on_event, on_reset, subscribed)),
+            asyncio.create_task(self._publish_loop()),
+        ]
+        # Serve requests only once other workers' events are coming in;
+        # a worker that cannot reach Redis yet starts anyway and catches up
+        # with a reset when it does
+        try:
+            await asyncio.wait_for(subscribed.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            logger.warning("Invalidation bus not subscribed yet, starting without it")
+
+    def publish(self, scope: Hashable):
+        if self._queue is not None:
+            self._queue.put_nowait(scope)
+
+    async def _publish_loop(self):
+        while True:
+            scopes = [await self._queue.get()]
+            while not self._queue.empty():
+                scopes.append(self._queue.get_nowait())
+            # A burst of writes to one class sends its scope once
+            unique = list(dict.fromkeys(scopes))
+            message = json.dumps({"origin": self.origin, "scopes": [list(scope) for scope in unique]})
+            try:
+                await self.client.publish(self.channel, message)
+                self.published += len(scopes)
+            except Exception as e:
+                # When Redis is unreachable the subscribers are disconnected
+                # too, and they reset once they are back
+                logger.warning("Invalidation publish failed: %s", e)
+            finally:
+                for _ in scopes:
+                    self._queue.task_done()
+
+    async def _listen(self, on_event, on_reset, subscribed: asyncio.Event):
+        backoff = 0.1
+        first = True
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                self.connected = True
+                backoff = 0.1
+                if not first:
+                    # Events published while unsubscribed are gone
+                    self.resets += 1
+                    on_reset()
+                first = False
+                subscribed.set()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    event = json.loads(message["data"])
+                    if event["origin"] == self.origin:
+                        continue
+                    self.received += 1
+                    for scope in event["scopes"]:
+                        on_event(tuple(scope))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Invalidation bus disconnected, resubscribing: %s", e)
+            finally:
+                self.connected = False
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            first = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def stats(self):
+        return {
+            "bus": self.name,
+            "connected": self.connected,
+            "published": self.published,
+            "received": self.received,
+            "resets": self.resets,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+    async def close(self, timeout: float = 2.0):
+        """Send the events still queued, then disconnect."""
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Invalidation bus closed with %d events unsent", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.client is not None:
+            await self.client.aclose()
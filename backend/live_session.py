@@ -0,0 +1,72 @@
+import random
+from typing import Any, Dict, List, Optional
+
+
+class LiveSession:
+    """Roster and per-student answer counts of one class, held for a live session.
+
+    Picks and statistics are computed from memory; the session handler
+    persists each score and then records it here, and reloads the session
+    when another writer changed the class.
+    """
+
+    def __init__(self, class_id: str, students: List[Dict[str, Any]], stats: List[Dict[str, Any]], revision: int):
+        self.class_id = class_id
+        self.revision = revision
+        self.students = {student["id"]: student for student in students}
+        self.correct: Dict[str, int] = {}
+        self.wrong: Dict[str, int] = {}
+        self.totals: Dict[str, int] = {}
+        # Names of assessed students who are no longer on the roster
+        self.names: Dict[str, Dict[str, Any]] = {}
+        for stat in stats:
+            self.correct[stat["_id"]] = stat["correct"]
+            self.wrong[stat["_id"]] = stat["wrong"]
+            self.totals[stat["_id"]] = stat["total"]
+            self.names[stat["_id"]] = {"name": stat.get("student_name"), "student_number": stat.get("student_number")}
+        self.current: Optional[str] = None
+
+    def pick(self) -> Optional[Dict[str, Any]]:
+        # Same rule as the random-student endpoint: a random student among
+        # those with the fewest assessments
+        if not self.students:
+            self.current = None
+            return None
+        fewest = min(self.totals.get(student_id, 0) for student_id in self.students)
+        eligible = [student_id for student_id in self.students if self.totals.get(student_id, 0) == fewest]
+        self.current = random.choice(eligible)
+        return self.students[self.current]
+
+    def record(self, student_id: str, score: int):
+        if score == 1:
+            self.correct[student_id] = self.correct.get(student_id, 0) + 1
+        elif score == 0:
+            self.wrong[student_id] = self.wrong.get(student_id, 0) + 1
+        self.totals[student_id] = self.totals.get(student_id, 0) + 1
+
+    def statistics(self) -> Dict[str, Any]:
+        """Class statistics in the shape of the statistics endpoint."""
+        student_details = []
+        for student_id, total in self.totals.items():
+            student = self.students.get(student_id) or self.names.get(student_id, {})
+            correct = self.correct.get(student_id, 0)
+            student_details.append({
+                "student_id": student_id,
+                "student_name": student.get("name") or "",
+                "student_number": student.get("student_number") or "",
+                "correct": correct,
+                "wrong": self.wrong.get(student_id, 0),
+                "total": total,
+                "correct_percentage": round(correct / total * 100 if total > 0 else 0, 2)
+            })
+        student_details.sort(key=lambda detail: detail["student_number"])
+        correct_answers = sum(self.correct.values())
+        wrong_answers = sum(self.wrong.values())
+        return {
+            "total_students": len(self.students),
+            "assessed_students": len(self.totals),
+            "correct_answers": correct_answers,
+            "wrong_answers": wrong_answers,
+            "total_assessments": correct_answers + wrong_answers,
+            "student_details": student_details
+        }
@@ -0,0 +1,157 @@
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from pymongo import monitoring
+from pythonjsonlogger import jsonlogger
+
+# Per-request fields attached to every record logged while handling it. The
+# middleware stores a fresh dict here and the code below mutates it in place,
+# so values set deeper in the request (teacher id, DB time) reach the access
+# log even across task boundaries.
+request_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_context", default=None)
+
+
+class RequestContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = request_context.get()
+        if context:
+            for key, value in context.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks: records are dropped when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingLogWriter(threading.Thread):
+    """Drain the log queue in batches and write each batch with one call."""
+
+    _STOP = object()
+
+    def __init__(self, log_queue: queue.Queue, formatter: logging.Formatter, stream=None,
+                 batch_size: int = 256, flush_interval: float = 0.5):
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = log_queue
+        self.formatter = formatter
+        self.stream = stream or sys.stderr
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if self._STOP in batch:
+                stopping = True
+                batch = [record for record in batch if record is not self._STOP]
+            self._write(batch)
+
+    def _write(self, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.formatter.format(record) + "\n")
+            except Exception:
+                continue
+        if lines:
+            try:
+                self.stream.write("".join(lines))
+                self.stream.flush()
+            except Exception:
+                pass
+
+    def stop(self, timeout: float = 5.0):
+        # Blocking put: the sentinel must not be dropped, and the writer is
+        # draining the queue so this returns promptly
+        self.queue.put(self._STOP)
+        self.join(timeout)
+
+
+class DbTimeListener(monitoring.CommandListener):
+    """Accumulate MongoDB command time into the current request context.
+
+    Motor copies the caller's context into its executor threads, so the
+    callbacks see the context of the request that issued the command.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._add(event)
+
+    def failed(self, event):
+        self._add(event)
+
+    def _add(self, event):
+        context = request_context.get()
+        if context is not None:
+            context["db_ms"] = round(context.get("db_ms", 0) + event.duration_micros / 1000, 3)
+            context["db_commands"] = context.get("db_commands", 0) + 1
+
+
+_writer: Optional[BatchingLogWriter] = None
+_handler: Optional[DroppingQueueHandler] = None
+
+
+def configure_logging(level: int = logging.INFO, json_format: bool = True,
+                      queue_size: int = 10000, batch_size: int = 256):
+    global _writer, _handler
+    if json_format:
+        formatter = jsonlogger.JsonFormatter("%(asctime)s %(levelname)s %(name)s %(message)s")
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    _handler = DroppingQueueHandler(log_queue)
+    _handler.addFilter(RequestContextFilter())
+    _writer = BatchingLogWriter(log_queue, formatter, batch_size=batch_size)
+    _writer.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(level)
+
+    # Route uvicorn's loggers through the same non-blocking pipeline
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler else 0
+
+
+def shutdown_logging():
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
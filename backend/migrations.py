@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# How long a runner may hold a migration before another process can take over
+LEASE_SECONDS = 60
+
+
+class Migration:
+    """A resumable, batched data migration over one collection.
+
+    ``query`` selects documents that still need migrating and ``apply`` turns
+    one batch of them into bulk write operations. Documents are visited in
+    ``_id`` order and the last ``_id`` of every committed batch is persisted,
+    so an interrupted run resumes where it stopped.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        collection: str,
+        query: Dict[str, Any],
+        apply: Callable[[Any, List[Dict[str, Any]]], Awaitable[List[Any]]],
+        projection: Optional[Dict[str, Any]] = None,
+        batch_size: int = 500,
+        pause: float = 0.05,
+    ):
+        self.name = name
+        self.collection = collection
+        self.query = query
+        self.apply = apply
+        self.projection = projection
+        self.batch_size = batch_size
+        self.pause = pause
+
+
+class MigrationRunner:
+    def __init__(self, migrations: List[Migration]):
+        self.migrations = {migration.name: migration for migration in migrations}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._running = set()
+
+    async def status(self, db) -> List[Dict[str, Any]]:
+        states = {state["_id"]: state for state in await db.migrations.find().to_list(None)}
+        result = []
+        for name in self.migrations:
+            state = {key: value for key, value in states.get(name, {"status": "pending"}).items() if key != "_id"}
+            if state.get("last_id") is not None:
+                state["last_id"] = str(state["last_id"])
+            result.append({"name": name, **state})
+        return result
+
+    async def _claim(self, db, name: str) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        await db.migrations.update_one(
+            {"_id": name},
+            {"$setOnInsert": {"status": "pending", "last_id": None, "processed": 0, "locked_until": None}},
+            upsert=True,
+        )
+        return await db.migrations.find_one_and_update(
+            {
+                "_id": name,
+                "status": {"$ne": "completed"},
+                "$or": [{"locked_until": None}, {"locked_until": {"$lt": now}}],
+            },
+            {"$set": {
+                "status": "running",
+                "owner": self.owner,
+                "locked_until": now + timedelta(seconds=LEASE_SECONDS),
+                "started_at": now,
+            }},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def run(self, db, name: str) -> Optional[Dict[str, Any]]:
+        if name in self._running:
+            return await db.migrations.find_one({"_id": name})
+        self._running.add(name)
+        try:
+            return await self._run(db, name)
+        finally:
+            self._running.discard(name)
+
+    async def _run(self, db, name: str) -> Optional[Dict[str, Any]]:
+        migration = self.migrations[name]
+        state = await self._claim(db, name)
+        if state is None:
+            # Already completed, or another process holds the lease
+            return await db.migrations.find_one({"_id": name})
+
+        last_id, processed = state.get("last_id"), state.get("processed", 0)
+        collection = db[migration.collection]
+        try:
+            while True:
+                query = dict(migration.query)
+                if last_id is not None:
+                    query["_id"] = {"$gt": last_id}
+                batch = await collection.find(query, migration.projection).sort("_id", 1).to_list(migration.batch_size)
+                if not batch:
+                    break
+
+                operations = await migration.apply(db, batch)
+                if operations:
+                    await collection.bulk_write(operations, ordered=False)
+                last_id, processed = batch[-1]["_id"], processed + len(batch)
+
+                # Checkpoint and renew the lease after every committed batch
+                await db.migrations.update_one({"_id": name}, {"$set": {
+                    "last_id": last_id,
+                    "processed": processed,
+                    "locked_until": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS),
+                }})
+                # Yield to foreground traffic between batches
+                await asyncio.sleep(migration.pause)
+        except Exception as e:
+            logger.exception("Migration %s failed", name)
+            await db.migrations.update_one({"_id": name}, {"$set": {
+                "status": "failed", "error": str(e), "locked_until": None,
+            }})
+            raise
+
+        await db.migrations.update_one({"_id": name}, {"$set": {
+            "status": "completed", "finished_at": datetime.utcnow(), "locked_until": None, "error": None,
+        }})
+        return await db.migrations.find_one({"_id": name})
+
+    async def run_all(self, db):
+        for name in self.migrations:
+            try:
+                await self.run(db, name)
+            except Exception:
+                # Logged by run; later migrations may not depend on this one
+                continue
+
+
+# Migrations
+
+async def _denormalize_student_fields(db, batch: List[Dict[str, Any]]) -> List[Any]:
+    student_ids = list({assessment["student_id"] for assessment in batch})
+    students = await db.students.find(
+        {"id": {"$in": student_ids}},
+        {"_id": 0, "id": 1, "name": 1, "student_number": 1},
+    ).to_list(None)
+    students_dict = {student["id"]: student for student in students}
+    operations = []
+    for assessment in batch:
+        student = students_dict.get(assessment["student_id"], {})
+        operations.append(UpdateOne({"_id": assessment["_id"]}, {"$set": {
+            "student_name": student.get("name"),
+            "student_number": student.get("student_number"),
+        }}))
+    return operations
+
+
+MIGRATIONS = [
+    Migration(
+        name="0001_denormalize_assessment_student_fields",
+        collection="assessments",
+        query={"student_number": {"$exists": False}},
+        projection={"_id": 1, "student_id": 1},
+        apply=_denormalize_student_fields,
+    ),
+]
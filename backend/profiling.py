@@ -0,0 +1,151 @@
+import os
+import sys
+import threading
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _fold(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Statistical CPU profiler for one thread.
+
+    A daemon thread samples the target thread's stack every ``interval``
+    seconds and counts identical stacks. The result is in the folded format
+    understood by flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_fold(frame)] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+
+def folded(stacks: Counter) -> str:
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+
+class ProfileStore:
+    """Ring buffer of the most recent request profiles."""
+
+    def __init__(self, max_profiles: int = 50):
+        self._profiles: deque = deque(maxlen=max_profiles)
+
+    def add(self, method: str, path: str, duration_ms: float, stacks: Counter) -> Dict[str, Any]:
+        profile = {
+            "id": str(uuid.uuid4()),
+            "method": method,
+            "path": path,
+            "duration_ms": round(duration_ms, 2),
+            "samples": sum(stacks.values()),
+            "created_at": datetime.utcnow(),
+            "stacks": stacks,
+        }
+        self._profiles.append(profile)
+        return profile
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [
+            {key: value for key, value in profile.items() if key != "stacks"}
+            for profile in reversed(self._profiles)
+        ]
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        return next((profile for profile in self._profiles if profile["id"] == profile_id), None)
+
+    def merged(self, path: str = None) -> Counter:
+        stacks: Counter = Counter()
+        for profile in self._profiles:
+            if path is None or profile["path"] == path:
+                stacks.update(profile["stacks"])
+        return stacks
+
+    def clear(self):
+        self._profiles.clear()
+
+
+class MemorySnapshots:
+    """tracemalloc snapshots that can be diffed against each other."""
+
+    def __init__(self, max_snapshots: int = 5, frames: int = 25):
+        self.max_snapshots = max_snapshots
+        self.frames = frames
+        self._snapshots: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def take(self) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        entry = {
+            "id": str(uuid.uuid4()),
+            "created_at": datetime.utcnow(),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+        }
+        self._snapshots[entry["id"]] = {**entry, "snapshot": snapshot}
+        while len(self._snapshots) > self.max_snapshots:
+            self._snapshots.popitem(last=False)
+        return entry
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [
+            {key: value for key, value in entry.items() if key != "snapshot"}
+            for entry in self._snapshots.values()
+        ]
+
+    def diff(self, old_id: str, new_id: str, key_type: str = "lineno", limit: int = 25) -> Optional[List[Dict[str, Any]]]:
+        old, new = self._snapshots.get(old_id), self._snapshots.get(new_id)
+        if old is None or new is None:
+            return None
+        stats = new["snapshot"].compare_to(old["snapshot"], key_type)
+        return [
+            {
+                "location": str(stat.traceback),
+                "size_diff": stat.size_diff,
+                "size": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            }
+            for stat in stats[:limit]
+        ]
+
+    def stop(self):
+        self._snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
@@ -0,0 +1,58 @@
+import gzip
+import uuid
+from datetime import datetime
+from typing import BinaryIO, Iterator, List
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def is_gzip(fileobj: BinaryIO, filename: str = None, content_type: str = None) -> bool:
+    if filename and filename.lower().endswith(".gz"):
+        return True
+    if content_type in ("application/gzip", "application/x-gzip"):
+        return True
+    head = fileobj.read(2)
+    fileobj.seek(0)
+    return head == GZIP_MAGIC
+
+
+def open_csv_stream(fileobj: BinaryIO, filename: str = None, content_type: str = None) -> BinaryIO:
+    if is_gzip(fileobj, filename, content_type):
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    return fileobj
+
+
+def iter_student_chunks(
+    stream: BinaryIO,
+    class_id: str,
+    teacher_id: str,
+    chunk_rows: int = 1000,
+) -> Iterator[List[dict]]:
+    # Imported here to keep pandas out of the server's startup
+    import pandas as pd
+
+    # Parse the CSV in bounded chunks so only chunk_rows rows are in memory at once
+    reader = pd.read_csv(
+        stream,
+        chunksize=chunk_rows,
+        dtype=str,
+        keep_default_na=False,
+    )
+    for df in reader:
+        if "student_number" not in df.columns:
+            raise ValueError("CSV must contain a student_number column")
+        has_name = "name" in df.columns
+        now = datetime.utcnow()
+        batch = []
+        for row in df.itertuples(index=False):
+            name = getattr(row, "name") if has_name else None
+            batch.append({
+                "id": str(uuid.uuid4()),
+                "student_number": row.student_number,
+                "name": name or None,
+                "class_id": class_id,
+                "teacher_id": teacher_id,
+                "created_at": now,
+            })
+        if batch:
+            yield batch
@@ -1,34 +1,98 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Body, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Body, Query, UploadFile, File, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
+import shutil
+import tempfile
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any, Union
+from pydantic import BaseModel, ConfigDict, Field, EmailStr, TypeAdapter
+from typing import List, Optional, Dict, Any, Type, Union
 import uuid
 from datetime import datetime, timedelta
 import jwt
 from passlib.context import CryptContext
-import pandas as pd
 from io import StringIO
 import random
 import json
+import heapq
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+
+from singleflight import SingleFlight
+from cache import RevisionTracker, VersionedCache
+from changelog import ChangeLog, ChangesExpired
+from profiling import SamplingProfiler, ProfileStore, MemorySnapshots, folded
+from slowlog import SlowQueryLog
+from migrations import MigrationRunner, MIGRATIONS
+from logging_setup import configure_logging, shutdown_logging, dropped_records, request_context, DbTimeListener
+from roster_import import open_csv_stream, iter_student_chunks
+from encoding import encode_response
+from analytics import ClassHistory, participation_metrics
+from live_session import LiveSession
+from group_commit import GroupCommit
+from spool import DurableSpool
+from invalidation import LocalBus, RedisBus
+from batch import call_asgi, decode_body
+from snapshot import SnapshotWriter, iter_snapshot
+from storage import LIST_LIMIT, STUDENT_SORTS, MongoRepository, MemoryRepository, PartialWrite
 
 # JWT Configuration
 SECRET_KEY = "your-secret-key"  # In production, use a secure key from environment variables
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Teachers allowed to use the admin endpoints
+ADMIN_EMAILS = {email.strip() for email in os.environ.get("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+# Roster upload configuration
+UPLOAD_CHUNK_ROWS = int(os.environ.get("UPLOAD_CHUNK_ROWS", 1000))
+UPLOAD_BACKGROUND_BYTES = int(os.environ.get("UPLOAD_BACKGROUND_BYTES", 1024 * 1024))  # 1 MB
+
+# Documents per compressed chunk on snapshot export and per insert on import
+SNAPSHOT_BATCH_SIZE = int(os.environ.get("SNAPSHOT_BATCH_SIZE", 1000))
+
+# Upper bound on the sub-requests of one /batch call
+BATCH_MAX_REQUESTS = int(os.environ.get("BATCH_MAX_REQUESTS", 20))
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Commands slower than SLOW_QUERY_MS are recorded and explained once per shape
+slow_query_log = SlowQueryLog(threshold_ms=float(os.environ.get("SLOW_QUERY_MS", 100)))
+
+# Storage backend: mongo (default), sql or memory. The Motor client and db
+# are only set for mongo; the slow query log and migrations need them.
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "mongo")
+if STORAGE_BACKEND not in ("mongo", "sql", "memory"):
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+client = None
+db = None
+repo = None
+
+# Seconds /readyz waits for the database before reporting it unavailable
+READY_TIMEOUT = float(os.environ.get("READY_TIMEOUT", 2))
+
+def open_storage():
+    # Called from each worker's startup rather than at import, so no worker
+    # uses connections created before it was forked
+    global client, db, repo
+    if STORAGE_BACKEND == "mongo":
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'], event_listeners=[slow_query_log, DbTimeListener()])
+        db = client[os.environ['DB_NAME']]
+        repo = MongoRepository(db)
+    elif STORAGE_BACKEND == "sql":
+        from storage.sql import SQLRepository
+        repo = SQLRepository(os.environ['DATABASE_URL'])
+    else:
+        repo = MemoryRepository()
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -36,6 +100,36 @@ app = FastAPI()
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Concurrent identical reads for the same class and teacher share one query
+read_flights = SingleFlight()
+
+# Read-through cache of class- and teacher-scoped query results. Entries are
+# keyed by the scope's revision, which every mutating handler bumps.
+revisions = RevisionTracker()
+read_cache = VersionedCache(int(os.environ.get("CACHE_MAX_ENTRIES", 2048)))
+
+# With INVALIDATION_REDIS_URL set, every revision bump is also published to
+# the other workers over Redis pub/sub, so each worker's cache stays coherent
+INVALIDATION_REDIS_URL = os.environ.get("INVALIDATION_REDIS_URL")
+invalidation_bus = RedisBus(INVALIDATION_REDIS_URL) if INVALIDATION_REDIS_URL else LocalBus()
+
+# Student and assessment changes per class, for incremental client sync.
+# Entries older than CHANGES_RETENTION_DAYS are trimmed every
+# CHANGES_TRIM_SECONDS
+change_log = ChangeLog()
+CHANGES_RETENTION_DAYS = float(os.environ.get("CHANGES_RETENTION_DAYS", 7))
+CHANGES_TRIM_SECONDS = float(os.environ.get("CHANGES_TRIM_SECONDS", 3600))
+
+# Group commit of assessment inserts: with ASSESSMENT_BATCH_MS > 0, inserts
+# from concurrent requests within that window are written together
+ASSESSMENT_BATCH_MS = float(os.environ.get("ASSESSMENT_BATCH_MS", 0))
+ASSESSMENT_BATCH_SIZE = int(os.environ.get("ASSESSMENT_BATCH_SIZE", 100))
+
+# Durable local spool: with ASSESSMENT_SPOOL_DIR set, assessments are
+# acknowledged once fsync'd to a journal there and written to the database
+# in the background, so reads may lag behind for a moment
+ASSESSMENT_SPOOL_DIR = os.environ.get("ASSESSMENT_SPOOL_DIR")
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token")
@@ -58,22 +152,23 @@ class TeacherCreate(TeacherBase):
     password: str
 
 class Teacher(TeacherBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        orm_mode = True
-
 class StudentBase(BaseModel):
     name: Optional[str] = None
     student_number: str
 
 class Student(StudentBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        orm_mode = True
+class StudentSearchResult(Student):
+    class_id: str
 
 class ClassBase(BaseModel):
     name: str
@@ -82,27 +177,114 @@ class ClassCreate(ClassBase):
     pass
 
 class Class(ClassBase):
+    model_config = ConfigDict(from_attributes=True)
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     teacher_id: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    
-    class Config:
-        orm_mode = True
+
+class ClassOverview(Class):
+    total_students: int = 0
+    total_assessments: int = 0
+    correct_answers: int = 0
+    wrong_answers: int = 0
+    last_activity: Optional[datetime] = None  # date of the latest assessment
+
+class ClassClone(BaseModel):
+    name: Optional[str] = None  # defaults to the source name with " (copy)"
+    include_history: bool = False
+
+class StudentTransfer(BaseModel):
+    target_class_id: str
+    student_ids: List[str] = Field(..., min_length=1, max_length=LIST_LIMIT)
 
 class Assessment(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     student_id: str
     class_id: str
     teacher_id: str
     score: int  # 1 for correct, 0 for wrong
     date: datetime = Field(default_factory=datetime.utcnow)
-    
-    class Config:
-        orm_mode = True
+    # Denormalized from the student at write time and kept in sync on edits
+    student_name: Optional[str] = None
+    student_number: Optional[str] = None
 
 class FileUpload(BaseModel):
     content: str
 
+class ProfilingSettings(BaseModel):
+    sample_rate: float = Field(0.0, ge=0.0, le=1.0)  # fraction of requests to profile
+    interval_ms: float = Field(5.0, gt=0)  # stack sampling interval
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None  # echoed back with the response
+    method: str = Field("GET", pattern="^(GET|POST|PUT|DELETE)$")
+    path: str = Field(..., pattern="^/")  # below /api, with an optional query string
+    body: Optional[Any] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(..., min_length=1, max_length=BATCH_MAX_REQUESTS)
+
+class ImportJob(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    class_id: str
+    teacher_id: str
+    status: str = "pending"  # pending, running, completed or failed
+    # Imports are not atomic: a failed job keeps the students it added
+    students_added: int = 0
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+# Whole lists are validated in one call rather than one model per row
+StudentList = TypeAdapter(List[Student])
+AssessmentList = TypeAdapter(List[Assessment])
+
+row_defaults: Dict[tuple, Dict[str, Any]] = {}
+
+def trusted_rows(model: Type[BaseModel], docs: List[Dict[str, Any]],
+                 fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Documents read back from the repository, cut down to the model's fields.
+
+    They were validated on their way in, so they are not validated again;
+    missing fields get the model's default (None for generated ones). With
+    ``fields`` only those are kept.
+    """
+    key = (model, tuple(fields) if fields is not None else None)
+    defaults = row_defaults.get(key)
+    if defaults is None:
+        defaults = row_defaults[key] = {
+            name: None if field.is_required() or field.default_factory else field.default
+            for name, field in model.model_fields.items() if fields is None or name in fields
+        }
+    return [{name: doc.get(name, default) for name, default in defaults.items()} for doc in docs]
+
+def requested_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[List[str]]:
+    """Parse a comma-separated ``fields`` query parameter against the model.
+
+    Returns the fields in model order, so equal requests share cache
+    entries, or None when the parameter is absent.
+    """
+    if fields is None:
+        return None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    if not names:
+        raise HTTPException(status_code=400, detail="No fields requested")
+    unknown = names - set(model.model_fields)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Available: {', '.join(model.model_fields)}"
+        )
+    return [name for name in model.model_fields if name in names]
+
+def fields_key(kind: str, fields: Optional[List[str]]) -> str:
+    return kind if fields is None else f"{kind}:{','.join(fields)}"
+
 # Authentication functions
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -111,18 +293,17 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 async def get_teacher(email: str):
-    teacher = await db.teachers.find_one({"email": email})
+    teacher = await repo.get_teacher_by_email(email)
     if teacher:
         return Teacher(**teacher)
 
 async def authenticate_teacher(email: str, password: str):
-    teacher = await get_teacher(email)
-    if not teacher:
+    teacher_dict = await repo.get_teacher_by_email(email)
+    if not teacher_dict:
         return False
-    teacher_dict = await db.teachers.find_one({"email": email})
     if not verify_password(password, teacher_dict["password"]):
         return False
-    return teacher
+    return Teacher(**teacher_dict)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -134,7 +315,14 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_teacher(token: str = Depends(oauth2_scheme)):
+# Teacher authenticated by a /batch call. Its sub-requests carry the same
+# token and reuse the teacher instead of decoding and looking it up again
+batch_teacher: ContextVar[Optional[tuple]] = ContextVar("batch_teacher", default=None)
+
+async def teacher_from_token(token: str):
+    shared = batch_teacher.get()
+    if shared is not None and secrets.compare_digest(shared[0], token):
+        return shared[1]
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -153,10 +341,22 @@ async def get_current_teacher(token: str = Depends(oauth2_scheme)):
         raise credentials_exception
     return teacher
 
+async def get_current_teacher(token: str = Depends(oauth2_scheme)):
+    teacher = await teacher_from_token(token)
+    context = request_context.get()
+    if context is not None:
+        context["teacher_id"] = teacher.id
+    return teacher
+
+async def get_current_admin(current_teacher: Teacher = Depends(get_current_teacher)):
+    if current_teacher.email not in ADMIN_EMAILS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_teacher
+
 # Authentication routes
 @api_router.post("/register", response_model=Token)
 async def register_teacher(teacher: TeacherCreate):
-    db_teacher = await db.teachers.find_one({"email": teacher.email})
+    db_teacher = await repo.get_teacher_by_email(teacher.email)
     if db_teacher:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -168,10 +368,10 @@ async def register_teacher(teacher: TeacherCreate):
         created_at=datetime.utcnow()
     )
     
-    teacher_dict = teacher_data.dict()
+    teacher_dict = teacher_data.model_dump()
     teacher_dict["password"] = hashed_password
     
-    await db.teachers.insert_one(teacher_dict)
+    await repo.create_teacher(teacher_dict)
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -205,6 +405,63 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         name=teacher.name
     )
 
+# Cached and coalesced class-scoped reads
+def class_scope(class_id: str):
+    return ("class", class_id)
+
+def teacher_scope(teacher_id: str):
+    return ("teacher", teacher_id)
+
+def bump_scope(scope):
+    # Entries of the old revision can no longer be served; free them now
+    revisions.bump(scope)
+    read_cache.evict_scope(scope)
+
+def bump_all_scopes():
+    revisions.bump_all()
+    read_cache.clear()
+
+def invalidate_class(class_id: str):
+    bump_scope(class_scope(class_id))
+    invalidation_bus.publish(class_scope(class_id))
+
+def invalidate_teacher(teacher_id: str):
+    bump_scope(teacher_scope(teacher_id))
+    invalidation_bus.publish(teacher_scope(teacher_id))
+
+async def cached_read(kind: str, scope, teacher_id: str, fn):
+    # The revision is read before loading, so a result that races with a
+    # write is served to its callers but not cached
+    revision = revisions.get(scope)
+    key = (kind, scope, revision, teacher_id)
+    found, value = read_cache.get(key)
+    if found:
+        return value
+    value = await read_flights.do(key, fn)
+    if revisions.get(scope) == revision:
+        read_cache.put(key, value, scope)
+    return value
+
+async def cached_class_read(kind: str, class_id: str, teacher_id: str, fn):
+    return await cached_read(kind, class_scope(class_id), teacher_id, fn)
+
+async def load_class(class_id: str, teacher_id: str):
+    async def load():
+        class_item = await repo.get_class(class_id, teacher_id)
+        if not class_item:
+            raise HTTPException(status_code=404, detail="Class not found")
+        return class_item
+
+    return await cached_class_read("class", class_id, teacher_id, load)
+
+async def load_roster(class_id: str, teacher_id: str, fields: Optional[List[str]] = None):
+    async def load():
+        # Check if class exists and belongs to teacher
+        await load_class(class_id, teacher_id)
+        return await repo.list_students(class_id, fields)
+
+    return await cached_class_read(fields_key("roster", fields), class_id, teacher_id, load)
+
 # Class routes
 @api_router.post("/classes", response_model=Class)
 async def create_class(class_item: ClassCreate, current_teacher: Teacher = Depends(get_current_teacher)):
@@ -215,34 +472,175 @@ async def create_class(class_item: ClassCreate, current_teacher: Teacher = Depen
         created_at=datetime.utcnow()
     )
     
-    await db.classes.insert_one(class_data.dict())
+    await repo.create_class(class_data.model_dump())
+    invalidate_teacher(current_teacher.id)
     return class_data
 
+# Sparse fieldsets: list endpoints take fields=id,name to read and return
+# only those fields of their response model
+FIELDS_QUERY = Query(None, max_length=200)
+
 @api_router.get("/classes", response_model=List[Class])
-async def get_classes(current_teacher: Teacher = Depends(get_current_teacher)):
-    classes = await db.classes.find({"teacher_id": current_teacher.id}).to_list(1000)
-    return [Class(**class_item) for class_item in classes]
+async def get_classes(
+    request: Request,
+    fields: Optional[str] = FIELDS_QUERY,
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    selected = requested_fields(fields, Class)
+    classes = await cached_read(
+        fields_key("classes", selected), teacher_scope(current_teacher.id), current_teacher.id,
+        lambda: repo.list_classes(current_teacher.id, selected)
+    )
+    return encode_response(request, trusted_rows(Class, classes, selected))
+
+@api_router.get("/overview", response_model=List[ClassOverview])
+async def get_overview(request: Request, current_teacher: Teacher = Depends(get_current_teacher)):
+    # Figures for all classes from one query grouped by class, whatever the
+    # number of classes
+    classes = await cached_read(
+        "classes", teacher_scope(current_teacher.id), current_teacher.id,
+        lambda: repo.list_classes(current_teacher.id)
+    )
+    counts = await repo.class_counts(current_teacher.id)
+    return encode_response(request, trusted_rows(
+        ClassOverview, [{**class_item, **counts.get(class_item["id"], {})} for class_item in classes]
+    ))
 
 @api_router.get("/classes/{class_id}", response_model=Class)
 async def get_class(class_id: str, current_teacher: Teacher = Depends(get_current_teacher)):
-    class_item = await db.classes.find_one({"id": class_id, "teacher_id": current_teacher.id})
-    if not class_item:
-        raise HTTPException(status_code=404, detail="Class not found")
-    return Class(**class_item)
+    class_item = await load_class(class_id, current_teacher.id)
+    return Class.model_construct(**class_item)
 
 @api_router.delete("/classes/{class_id}")
 async def delete_class(class_id: str, current_teacher: Teacher = Depends(get_current_teacher)):
-    result = await db.classes.delete_one({"id": class_id, "teacher_id": current_teacher.id})
-    if result.deleted_count == 0:
+    # Also deletes all students and assessments in this class
+    if not await repo.delete_class(class_id, current_teacher.id):
         raise HTTPException(status_code=404, detail="Class not found")
     
-    # Also delete all students in this class
-    await db.students.delete_many({"class_id": class_id})
+    await change_log.purge(repo, class_id)
+    invalidate_class(class_id)
+    invalidate_teacher(current_teacher.id)
+    return {"message": "Class deleted successfully"}
+
+@api_router.post("/classes/{class_id}/clone", response_model=Class)
+async def clone_class(
+    class_id: str,
+    clone: ClassClone = Body(ClassClone()),
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    source = await load_class(class_id, current_teacher.id)
+    class_data = Class(
+        id=str(uuid.uuid4()),
+        name=clone.name or f"{source['name']} (copy)",
+        teacher_id=current_teacher.id,
+        created_at=datetime.utcnow()
+    )
     
-    # Delete all assessments for this class
-    await db.assessments.delete_many({"class_id": class_id})
+    await repo.create_class(class_data.model_dump())
+    # Copied inside the database. Nobody has synced the new class yet, so
+    # its change log starts empty and clients begin with a snapshot
+    await repo.copy_students(class_id, class_data.id, include_history=clone.include_history)
+    invalidate_teacher(current_teacher.id)
+    return class_data
+
+# Class snapshots: a gzip-compressed JSON lines archive of a class, its
+# students and its assessments, streamed in batches both ways
+@api_router.get("/classes/{class_id}/snapshot")
+async def export_class_snapshot(class_id: str, current_teacher: Teacher = Depends(get_current_teacher)):
+    class_item = await load_class(class_id, current_teacher.id)
+
+    async def chunks():
+        writer = SnapshotWriter()
+        yield writer.header(class_item)
+        async for batch in repo.stream_students(class_id, SNAPSHOT_BATCH_SIZE):
+            data = await asyncio.to_thread(writer.documents, "student", batch)
+            if data:
+                yield data
+        async for batch in repo.stream_assessments(class_id, SNAPSHOT_BATCH_SIZE):
+            data = await asyncio.to_thread(writer.documents, "assessment", batch)
+            if data:
+                yield data
+        yield writer.close()
+
+    filename = f"class-{class_id}-{datetime.utcnow():%Y%m%d%H%M%S}.jsonl.gz"
+    return StreamingResponse(
+        chunks(), media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+async def restore_snapshot(fileobj, class_id: str, teacher_id: str, create: bool = False, name: Optional[str] = None):
+    """Insert a snapshot's documents under new ids into the class.
+
+    With ``create`` the class is created from the snapshot first, renamed
+    to ``name`` if given; otherwise it must exist and be empty. A failed
+    restore removes what it inserted.
+    """
+    chunks = iter_snapshot(fileobj, class_id, teacher_id, SNAPSHOT_BATCH_SIZE)
+    counts = {"student": 0, "assessment": 0}
+    class_item = None
+    try:
+        while True:
+            # Decompressed and parsed off the event loop, one batch at a time
+            item = await asyncio.to_thread(next, chunks, None)
+            if item is None:
+                break
+            kind, value = item
+            if kind == "class":
+                if create:
+                    class_item = Class.model_validate({**value, "name": name or value["name"], "created_at": datetime.utcnow()})
+                    await repo.create_class(class_item.model_dump())
+                continue
+            # Uploaded documents are validated like any other input
+            if kind == "student":
+                value = StudentList.dump_python(StudentList.validate_python(value))
+                await repo.insert_students([{**student, "class_id": class_id, "teacher_id": teacher_id} for student in value])
+            else:
+                value = AssessmentList.dump_python(AssessmentList.validate_python(value))
+                await repo.insert_assessments(value)
+            if not create:
+                # Clients already syncing the existing class
+                await change_log.record(repo, class_id, kind, "created", value)
+            counts[kind] += len(value)
+    except Exception as e:
+        if class_item is not None:
+            await repo.delete_class(class_id, teacher_id)
+            invalidate_teacher(teacher_id)
+        elif not create:
+            await repo.delete_students(class_id)
+            await change_log.reset(repo, class_id)
+        if isinstance(e, (ValueError, KeyError, OSError, EOFError)):
+            raise HTTPException(status_code=400, detail=f"Invalid snapshot: {str(e)}")
+        raise
+    finally:
+        invalidate_class(class_id)
+    if class_item is not None:
+        invalidate_teacher(teacher_id)
+    return class_item, counts
+
+@api_router.post("/snapshots")
+async def import_class_snapshot(
+    file: UploadFile = File(...),
+    name: Optional[str] = Query(None, max_length=200),  # defaults to the name in the snapshot
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    class_item, counts = await restore_snapshot(file.file, str(uuid.uuid4()), current_teacher.id, create=True, name=name)
+    if class_item is None:
+        raise HTTPException(status_code=400, detail="Invalid snapshot: no class record")
+    return {"class": class_item, "students": counts["student"], "assessments": counts["assessment"]}
+
+@api_router.post("/classes/{class_id}/snapshot")
+async def restore_class_snapshot(
+    class_id: str,
+    file: UploadFile = File(...),
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    # Restores into an emptied class, e.g. after deleting all its students
+    await load_class(class_id, current_teacher.id)
+    if await repo.count_students(class_id) or (await repo.assessment_totals(class_id))["assessed_students"]:
+        raise HTTPException(status_code=409, detail="Class must be empty to restore a snapshot into it")
     
-    return {"message": "Class deleted successfully"}
+    _, counts = await restore_snapshot(file.file, class_id, current_teacher.id)
+    return {"students": counts["student"], "assessments": counts["assessment"]}
 
 # Student routes
 @api_router.post("/classes/{class_id}/students", response_model=Student)
@@ -252,9 +650,7 @@ async def create_student(
     current_teacher: Teacher = Depends(get_current_teacher)
 ):
     # Check if class exists and belongs to teacher
-    class_item = await db.classes.find_one({"id": class_id, "teacher_id": current_teacher.id})
-    if not class_item:
-        raise HTTPException(status_code=404, detail="Class not found")
+    await load_class(class_id, current_teacher.id)
     
     # Create student
     student_data = Student(
@@ -264,11 +660,13 @@ async def create_student(
         created_at=datetime.utcnow()
     )
     
-    student_dict = student_data.dict()
+    student_dict = student_data.model_dump()
     student_dict["class_id"] = class_id
     student_dict["teacher_id"] = current_teacher.id
     
-    await db.students.insert_one(student_dict)
+    await repo.insert_students([student_dict])
+    await change_log.record(repo, class_id, "student", "created", [student_data.model_dump()])
+    invalidate_class(class_id)
     return student_data
 
 @api_router.post("/classes/{class_id}/students/upload")
@@ -278,10 +676,12 @@ async def upload_students(
     current_teacher: Teacher = Depends(get_current_teacher)
 ):
     # Check if class exists and belongs to teacher
-    class_item = await db.classes.find_one({"id": class_id, "teacher_id": current_teacher.id})
-    if not class_item:
-        raise HTTPException(status_code=404, detail="Class not found")
+    await load_class(class_id, current_teacher.id)
+    
+    # Imported on first use: pandas dominates the server's import time
+    import pandas as pd
     
+    added = []
     try:
         # Parse the CSV content
         df = pd.read_csv(StringIO(file_upload.content))
@@ -292,31 +692,243 @@ async def upload_students(
             student_data = {
                 "id": str(uuid.uuid4()),
                 "student_number": str(row.get("student_number", "")),
-                "name": row.get("name", None),
+                "name": None if pd.isna(row.get("name", None)) else row.get("name"),
                 "class_id": class_id,
                 "teacher_id": current_teacher.id,
                 "created_at": datetime.utcnow()
             }
-            await db.students.insert_one(student_data)
+            await repo.insert_students([student_data])
+            added.extend(trusted_rows(Student, [student_data]))
             students_added += 1
         
         return {"message": f"{students_added} students added successfully"}
     
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing file: {str(e)}")
+    
+    finally:
+        await change_log.record(repo, class_id, "student", "created", added)
+        invalidate_class(class_id)
+
+async def import_students(fileobj, filename, content_type, class_id: str, teacher_id: str, on_progress=None):
+    stream = open_csv_stream(fileobj, filename, content_type)
+    chunks = iter_student_chunks(stream, class_id, teacher_id, UPLOAD_CHUNK_ROWS)
+    students_added = 0
+    while True:
+        # Parse the next chunk off the event loop, then insert it in one round trip
+        batch = await asyncio.to_thread(next, chunks, None)
+        if batch is None:
+            break
+        await repo.insert_students(batch)
+        await change_log.record(repo, class_id, "student", "created", trusted_rows(Student, batch))
+        invalidate_class(class_id)
+        students_added += len(batch)
+        if on_progress:
+            await on_progress(students_added)
+    return students_added
+
+def spool_to_disk(fileobj) -> str:
+    with tempfile.NamedTemporaryFile(prefix="roster-", delete=False) as tmp:
+        shutil.copyfileobj(fileobj, tmp)
+        return tmp.name
+
+def import_error(error: Exception, students_added: int) -> str:
+    # Chunks already inserted stay in the class
+    return f"Error processing file: {str(error).strip()} ({students_added} students were added before the error)"
+
+async def run_import_job(job_id: str, path: str, filename, content_type, class_id: str, teacher_id: str):
+    progress = {"students_added": 0}
+
+    async def on_progress(students_added):
+        progress["students_added"] = students_added
+        await repo.update_import_job(job_id, {"students_added": students_added})
+
+    await repo.update_import_job(job_id, {"status": "running"})
+    try:
+        with open(path, "rb") as fileobj:
+            students_added = await import_students(
+                fileobj, filename, content_type, class_id, teacher_id, on_progress
+            )
+        update = {"status": "completed", "students_added": students_added}
+    except Exception as e:
+        logger.exception("Roster import job %s failed", job_id)
+        update = {
+            "status": "failed",
+            "students_added": progress["students_added"],
+            "error": import_error(e, progress["students_added"]),
+        }
+    finally:
+        os.unlink(path)
+    update["finished_at"] = datetime.utcnow()
+    await repo.update_import_job(job_id, update)
+
+# Keep references to running import jobs so they are not garbage collected
+import_tasks = set()
+
+@api_router.post("/classes/{class_id}/students/upload-file")
+async def upload_students_file(
+    class_id: str,
+    file: UploadFile = File(...),
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    # Check if class exists and belongs to teacher
+    await load_class(class_id, current_teacher.id)
+
+    # Large files are imported by a background job the client can poll
+    if file.size is not None and file.size > UPLOAD_BACKGROUND_BYTES:
+        job = ImportJob(class_id=class_id, teacher_id=current_teacher.id)
+        await repo.create_import_job(job.model_dump())
+        path = await asyncio.to_thread(spool_to_disk, file.file)
+        task = asyncio.create_task(run_import_job(
+            job.id, path, file.filename, file.content_type, class_id, current_teacher.id
+        ))
+        import_tasks.add(task)
+        task.add_done_callback(import_tasks.discard)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"job_id": job.id, "status": job.status}
+        )
+
+    progress = {"students_added": 0}
+
+    async def on_progress(students_added):
+        progress["students_added"] = students_added
+
+    try:
+        students_added = await import_students(
+            file.file, file.filename, file.content_type, class_id, current_teacher.id, on_progress
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=import_error(e, progress["students_added"]))
+
+    return {"message": f"{students_added} students added successfully"}
+
+@api_router.get("/imports/{job_id}", response_model=ImportJob)
+async def get_import_job(job_id: str, current_teacher: Teacher = Depends(get_current_teacher)):
+    job = await repo.get_import_job(job_id, current_teacher.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return ImportJob.model_construct(**job)
+
+STUDENT_SORT_PATTERN = f"^({'|'.join(STUDENT_SORTS)})$"
 
 @api_router.get("/classes/{class_id}/students", response_model=List[Student])
 async def get_students(
     class_id: str, 
+    request: Request,
+    q: Optional[str] = Query(None, min_length=1, max_length=100),  # name or student number prefix
+    sort: Optional[str] = Query(None, pattern=STUDENT_SORT_PATTERN),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    unassessed: bool = False,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(LIST_LIMIT, ge=1, le=LIST_LIMIT),
+    fields: Optional[str] = FIELDS_QUERY,
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    selected = requested_fields(fields, Student)
+    if q is None and sort is None and not unassessed and offset == 0 and limit == LIST_LIMIT:
+        students = await load_roster(class_id, current_teacher.id, selected)
+    else:
+        # Without a sort, pages keep the roster's insertion order
+        default_sort = None if q is None and not unassessed else "name"
+
+        async def load():
+            await load_class(class_id, current_teacher.id)
+            return await repo.search_students(
+                [class_id], q, sort or default_sort, order == "desc", unassessed, offset, limit, selected
+            )
+
+        kind = fields_key(f"students:{q}:{sort}:{order}:{unassessed}:{offset}:{limit}", selected)
+        students = await cached_class_read(kind, class_id, current_teacher.id, load)
+    return encode_response(request, trusted_rows(Student, students, selected))
+
+@api_router.get("/students/search", response_model=List[StudentSearchResult])
+async def search_students(
+    request: Request,
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
+    sort: str = Query("name", pattern=STUDENT_SORT_PATTERN),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    unassessed: bool = False,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=LIST_LIMIT),
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    # Across all of the teacher's classes
+    classes = await repo.list_classes(current_teacher.id)
+    if not classes:
+        return []
+    students = await repo.search_students(
+        [class_item["id"] for class_item in classes], q, sort, order == "desc", unassessed, offset, limit
+    )
+    return encode_response(request, trusted_rows(StudentSearchResult, students))
+
+@api_router.put("/classes/{class_id}/students/{student_id}", response_model=Student)
+async def update_student(
+    class_id: str,
+    student_id: str,
+    student: StudentBase,
     current_teacher: Teacher = Depends(get_current_teacher)
 ):
     # Check if class exists and belongs to teacher
-    class_item = await db.classes.find_one({"id": class_id, "teacher_id": current_teacher.id})
-    if not class_item:
-        raise HTTPException(status_code=404, detail="Class not found")
+    await load_class(class_id, current_teacher.id)
+    
+    # Also keeps the denormalized copies on assessments in sync
+    updated = await repo.update_student(
+        class_id, student_id, {"name": student.name, "student_number": student.student_number}
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail="Student not found")
+    
+    student_data = trusted_rows(Student, [updated])
+    await change_log.record(repo, class_id, "student", "updated", student_data)
+    # Synced assessment rows carry the student's name and number too
+    assessments = await repo.list_student_assessments(class_id, student_id)
+    await change_log.record(repo, class_id, "assessment", "updated", trusted_rows(Assessment, assessments))
+    invalidate_class(class_id)
+    return student_data[0]
+
+async def load_transfer_target(class_id: str, transfer: StudentTransfer, teacher_id: str):
+    await load_class(class_id, teacher_id)
+    if transfer.target_class_id == class_id:
+        raise HTTPException(status_code=400, detail="Target class must differ from the source class")
+    await load_class(transfer.target_class_id, teacher_id)
+
+@api_router.post("/classes/{class_id}/students/copy", response_model=List[Student])
+async def copy_students(
+    class_id: str,
+    transfer: StudentTransfer,
+    request: Request,
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    await load_transfer_target(class_id, transfer, current_teacher.id)
+    
+    # The copies get new ids and start without assessments
+    copies = trusted_rows(Student, await repo.copy_students(
+        class_id, transfer.target_class_id, transfer.student_ids
+    ))
+    await change_log.record(repo, transfer.target_class_id, "student", "created", copies)
+    invalidate_class(transfer.target_class_id)
+    return encode_response(request, copies)
+
+@api_router.post("/classes/{class_id}/students/move", response_model=List[Student])
+async def move_students(
+    class_id: str,
+    transfer: StudentTransfer,
+    request: Request,
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    await load_transfer_target(class_id, transfer, current_teacher.id)
     
-    students = await db.students.find({"class_id": class_id}).to_list(1000)
-    return [Student(**student) for student in students]
+    # Students keep their ids and take their assessments along
+    students, assessments = await repo.move_students(class_id, transfer.target_class_id, transfer.student_ids)
+    moved = trusted_rows(Student, students)
+    await change_log.record(repo, class_id, "assessment", "deleted", assessments)
+    await change_log.record(repo, class_id, "student", "deleted", moved)
+    await change_log.record(repo, transfer.target_class_id, "student", "created", moved)
+    await change_log.record(repo, transfer.target_class_id, "assessment", "created", assessments)
+    invalidate_class(class_id)
+    invalidate_class(transfer.target_class_id)
+    return encode_response(request, moved)
 
 @api_router.delete("/classes/{class_id}/students")
 async def delete_all_students(
@@ -324,16 +936,14 @@ async def delete_all_students(
     current_teacher: Teacher = Depends(get_current_teacher)
 ):
     # Check if class exists and belongs to teacher
-    class_item = await db.classes.find_one({"id": class_id, "teacher_id": current_teacher.id})
-    if not class_item:
-        raise HTTPException(status_code=404, detail="Class not found")
-    
-    result = await db.students.delete_many({"class_id": class_id})
+    await load_class(class_id, current_teacher.id)
     
-    # Delete all assessments for this class
-    await db.assessments.delete_many({"class_id": class_id})
+    # Also deletes all assessments for this class
+    deleted_count = await repo.delete_students(class_id)
     
-    return {"message": f"{result.deleted_count} students deleted successfully"}
+    await change_log.reset(repo, class_id)
+    invalidate_class(class_id)
+    return {"message": f"{deleted_count} students deleted successfully"}
 
 # Assessment routes
 @api_router.post("/classes/{class_id}/assessments", response_model=Assessment)
@@ -344,153 +954,291 @@ async def create_assessment(
     current_teacher: Teacher = Depends(get_current_teacher)
 ):
     # Check if class exists and belongs to teacher
-    class_item = await db.classes.find_one({"id": class_id, "teacher_id": current_teacher.id})
-    if not class_item:
-        raise HTTPException(status_code=404, detail="Class not found")
+    await load_class(class_id, current_teacher.id)
     
     # Check if student exists and belongs to class
-    student = await db.students.find_one({"id": student_id, "class_id": class_id})
+    student = await repo.get_student(class_id, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Create assessment
+    return await record_assessment(class_id, current_teacher.id, student, score)
+
+async def record_assessment(class_id: str, teacher_id: str, student: dict, score: int):
     assessment = Assessment(
         id=str(uuid.uuid4()),
-        student_id=student_id,
+        student_id=student["id"],
         class_id=class_id,
-        teacher_id=current_teacher.id,
+        teacher_id=teacher_id,
         score=score,
-        date=datetime.utcnow()
+        date=datetime.utcnow(),
+        student_name=student.get("name"),
+        student_number=student.get("student_number")
     )
     
-    await db.assessments.insert_one(assessment.dict())
+    if assessment_spool is not None:
+        await assessment_spool.append(assessment.model_dump())
+        return assessment
+    if assessment_writer is not None:
+        await assessment_writer.submit(assessment.model_dump())
+    else:
+        error, = await write_assessments([assessment.model_dump()])
+        if error is not None:
+            raise error
     return assessment
 
+async def write_assessments(assessments: list):
+    # One unordered insert for the batch, then one change log write per class.
+    # Rows the store rejected fail on their own; the stored ones are logged
+    # and their classes' caches dropped either way
+    errors = [None] * len(assessments)
+    try:
+        await repo.insert_assessments(assessments)
+    except PartialWrite as e:
+        logger.error("%d of %d assessments were not stored: %s", len(e.failed), len(assessments), e.failed)
+        for index in e.failed:
+            errors[index] = e
+    by_class = {}
+    for assessment, error in zip(assessments, errors):
+        if error is None:
+            by_class.setdefault(assessment["class_id"], []).append(assessment)
+    for class_id, class_assessments in by_class.items():
+        await change_log.record(repo, class_id, "assessment", "created", class_assessments)
+        invalidate_class(class_id)
+    return errors
+
+assessment_writer = GroupCommit(
+    write_assessments, max_batch=ASSESSMENT_BATCH_SIZE, max_delay=ASSESSMENT_BATCH_MS / 1000
+) if ASSESSMENT_BATCH_MS > 0 else None
+
+async def replay_assessments(assessments: list):
+    # Journal entries can be replayed twice after a crash; only the ones
+    # not stored yet go to the change log
+    saved = await repo.save_assessments(assessments)
+    by_class = {}
+    for assessment in saved:
+        by_class.setdefault(assessment["class_id"], []).append(assessment)
+    for class_id, class_assessments in by_class.items():
+        await change_log.record(repo, class_id, "assessment", "created", class_assessments)
+    for class_id in {assessment["class_id"] for assessment in assessments}:
+        invalidate_class(class_id)
+
+assessment_spool = DurableSpool(
+    ASSESSMENT_SPOOL_DIR, replay_assessments, datetime_fields=("date",)
+) if ASSESSMENT_SPOOL_DIR else None
+
 @api_router.get("/classes/{class_id}/random-student")
 async def get_random_student(
     class_id: str,
     current_teacher: Teacher = Depends(get_current_teacher)
 ):
     # Check if class exists and belongs to teacher
-    class_item = await db.classes.find_one({"id": class_id, "teacher_id": current_teacher.id})
-    if not class_item:
-        raise HTTPException(status_code=404, detail="Class not found")
+    await load_class(class_id, current_teacher.id)
     
-    # Get all students in the class
-    students = await db.students.find({"class_id": class_id}).to_list(1000)
-    if not students:
+    # Students with the fewest assessments; once all are assessed equally
+    # this is the whole class again and a new cycle starts
+    eligible_students = await cached_class_read(
+        "eligible-students", class_id, current_teacher.id,
+        lambda: repo.least_assessed_students(class_id)
+    )
+    if not eligible_students:
         raise HTTPException(status_code=404, detail="No students found in this class")
     
-    # Get assessments for each student to find those with the least assessments
-    student_assessment_counts = {}
-    for student in students:
-        count = await db.assessments.count_documents({
-            "student_id": student["id"],
-            "class_id": class_id
-        })
-        student_assessment_counts[student["id"]] = count
-    
-    # Find minimum assessment count
-    min_assessments = min(student_assessment_counts.values()) if student_assessment_counts else 0
-    
-    # Find all students with the minimum number of assessments
-    eligible_students = [
-        student for student in students 
-        if student_assessment_counts[student["id"]] == min_assessments
-    ]
-    
-    # If all students have been assessed equally, start a new cycle
-    if not eligible_students:
-        eligible_students = students
-        
     # Select a random student from eligible students
-    if eligible_students:
-        random_student = random.choice(eligible_students)
-        return Student(**random_student)
-    else:
-        raise HTTPException(status_code=404, detail="No eligible students found")
+    random_student = random.choice(eligible_students)
+    return trusted_rows(Student, [random_student])[0]
+
+# Live session
+async def open_live_session(class_id: str, teacher_id: str):
+    # The revision is read before loading, so a write that races with the
+    # load makes the session reload on its next message
+    revision = revisions.get(class_scope(class_id))
+    students = await load_roster(class_id, teacher_id)
+    stats = await load_student_stats(class_id, teacher_id)
+    return LiveSession(class_id, students, stats, revision)
+
+def session_frame(frame_type: str, session: LiveSession, **fields):
+    student = session.students.get(session.current)
+    return {
+        "type": frame_type,
+        **fields,
+        "student": trusted_rows(Student, [student])[0] if student else None,
+        "statistics": session.statistics()
+    }
+
+@api_router.websocket("/classes/{class_id}/session")
+async def class_session(websocket: WebSocket, class_id: str, token: str = Query(...)):
+    """Live assessment session over one connection.
+
+    Authenticates once with the token query parameter, then accepts JSON
+    messages: {"type": "pick"} picks the next student, {"type": "score",
+    "score": 0|1, "student_id": optional, "pick_next": true} scores the
+    current (or given) student and picks the next one, and {"type":
+    "statistics"} resends the statistics. Every reply carries the current
+    student and the class statistics.
+    """
+    # Everything that can refuse the session runs before the handshake
+    try:
+        teacher = await teacher_from_token(token)
+        await load_class(class_id, teacher.id)
+        session = await open_live_session(class_id, teacher.id)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
+        return
+    
+    await websocket.accept()
+    scope = class_scope(class_id)
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except ValueError:
+                # A malformed frame is answered like any other bad message
+                await websocket.send_json({"type": "error", "detail": "Messages must be JSON"})
+                continue
+            message_type = message.get("type") if isinstance(message, dict) else None
+            
+            # Another request or session changed the class: start from fresh state
+            if revisions.get(scope) != session.revision:
+                current = session.current
+                session = await open_live_session(class_id, teacher.id)
+                session.current = current if current in session.students else None
+            
+            if message_type == "pick":
+                session.pick()
+                await websocket.send_json(jsonable_encoder(session_frame("student", session)))
+            elif message_type == "score":
+                student = session.students.get(message.get("student_id") or session.current)
+                score = message.get("score")
+                if student is None:
+                    await websocket.send_json({"type": "error", "detail": "Student not found"})
+                    continue
+                if score not in (0, 1) or isinstance(score, bool):
+                    await websocket.send_json({"type": "error", "detail": "Score must be 0 or 1"})
+                    continue
+                assessment = await record_assessment(class_id, teacher.id, student, score)
+                # Keep the session current with its own write, unless some
+                # other write happened meanwhile and it must reload
+                fresh = revisions.get(scope) == session.revision + 1
+                session.record(student["id"], score)
+                if fresh:
+                    session.revision = revisions.get(scope)
+                if message.get("pick_next", True):
+                    session.pick()
+                await websocket.send_json(jsonable_encoder(
+                    session_frame("scored", session, assessment=assessment.model_dump())
+                ))
+            elif message_type == "statistics":
+                await websocket.send_json(jsonable_encoder(session_frame("statistics", session)))
+            else:
+                await websocket.send_json({"type": "error", "detail": "Unknown message type"})
+    except WebSocketDisconnect:
+        pass
+    except HTTPException as e:
+        # The class was deleted during the session
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
 
 @api_router.get("/classes/{class_id}/assessments", response_model=List[Dict])
 async def get_assessments(
     class_id: str,
+    request: Request,
+    fields: Optional[str] = FIELDS_QUERY,
     current_teacher: Teacher = Depends(get_current_teacher)
 ):
+    selected = requested_fields(fields, Assessment)
+    result = await cached_class_read(
+        fields_key("assessments", selected), class_id, current_teacher.id,
+        lambda: compute_class_assessments(class_id, current_teacher.id, selected)
+    )
+    if selected is not None:
+        result = trusted_rows(Assessment, result, selected)
+    return encode_response(request, result)
+
+def missing_student_fields(rows: list) -> bool:
+    # Rows written before student fields were denormalized onto assessments
+    return any(row.get("student_number") is None for row in rows)
+
+async def compute_class_assessments(class_id: str, teacher_id: str, fields: Optional[List[str]] = None):
     # Check if class exists and belongs to teacher
-    class_item = await db.classes.find_one({"id": class_id, "teacher_id": current_teacher.id})
-    if not class_item:
-        raise HTTPException(status_code=404, detail="Class not found")
+    await load_class(class_id, teacher_id)
+    
+    # Rows that are not migrated yet get the student fields from their
+    # student, when those fields are wanted at all
+    enrich = fields is None or bool({"student_name", "student_number"} & set(fields))
+    if fields is not None and enrich:
+        fields = list(dict.fromkeys([*fields, "student_id", "student_number"]))
     
     # Get all assessments for this class
-    assessments = await db.assessments.find({"class_id": class_id}).to_list(1000)
+    assessments = await repo.list_assessments(class_id, fields)
+    if not enrich or not missing_student_fields(assessments):
+        return assessments
     
-    # Get all students in this class
-    students = await db.students.find({"class_id": class_id}).to_list(1000)
+    # Enrich assessments that are not migrated yet with student information
+    students = await load_roster(class_id, teacher_id)
     students_dict = {student["id"]: student for student in students}
-    
-    # Enrich assessments with student information
     result = []
     for assessment in assessments:
-        student = students_dict.get(assessment["student_id"], {})
-        result.append({
-            **assessment,
-            "student_name": student.get("name", ""),
-            "student_number": student.get("student_number", "")
-        })
+        if assessment.get("student_number") is None:
+            student = students_dict.get(assessment["student_id"], {})
+            assessment = {
+                **assessment,
+                "student_name": student.get("name", ""),
+                "student_number": student.get("student_number", "")
+            }
+        result.append(assessment)
     
     return result
 
-@api_router.get("/classes/{class_id}/statistics")
-async def get_class_statistics(
-    class_id: str,
-    current_teacher: Teacher = Depends(get_current_teacher)
-):
+async def load_student_stats(class_id: str, teacher_id: str):
+    async def load():
+        # Check if class exists and belongs to teacher
+        await load_class(class_id, teacher_id)
+        return await repo.student_stats(class_id)
+
+    return await cached_class_read("student-stats", class_id, teacher_id, load)
+
+def correct_percentage(stat: dict) -> float:
+    return round((stat["correct"] / stat["total"]) * 100 if stat["total"] > 0 else 0, 2)
+
+def student_stat_details(stat: dict, student: dict) -> dict:
+    if stat.get("student_number") is not None:
+        student = {"name": stat.get("student_name"), "student_number": stat["student_number"]}
+    return {
+        "student_id": stat["_id"],
+        "student_name": student.get("name") or "",
+        "student_number": student.get("student_number") or "",
+        "correct": stat["correct"],
+        "wrong": stat["wrong"],
+        "total": stat["total"],
+        "correct_percentage": correct_percentage(stat)
+    }
+
+async def compute_class_statistics(class_id: str, teacher_id: str):
     # Check if class exists and belongs to teacher
-    class_item = await db.classes.find_one({"id": class_id, "teacher_id": current_teacher.id})
-    if not class_item:
-        raise HTTPException(status_code=404, detail="Class not found")
+    await load_class(class_id, teacher_id)
     
     # Get all students in the class
-    total_students = await db.students.count_documents({"class_id": class_id})
+    total_students = await repo.count_students(class_id)
     
-    # Get unique students who have been assessed
-    assessed_students = await db.assessments.distinct("student_id", {"class_id": class_id})
-    assessed_count = len(assessed_students)
-    
-    # Get total counts of correct and wrong answers
-    correct_count = await db.assessments.count_documents({"class_id": class_id, "score": 1})
-    wrong_count = await db.assessments.count_documents({"class_id": class_id, "score": 0})
+    # Get the number of assessed students and of correct and wrong answers
+    totals = await repo.assessment_totals(class_id)
+    assessed_count = totals["assessed_students"]
+    correct_count = totals["correct"]
+    wrong_count = totals["wrong"]
     
     # Get student-level statistics
-    pipeline = [
-        {"$match": {"class_id": class_id}},
-        {"$group": {
-            "_id": "$student_id",
-            "correct": {"$sum": {"$cond": [{"$eq": ["$score", 1]}, 1, 0]}},
-            "wrong": {"$sum": {"$cond": [{"$eq": ["$score", 0]}, 1, 0]}},
-            "total": {"$sum": 1}
-        }}
-    ]
+    student_stats = await load_student_stats(class_id, teacher_id)
     
-    student_stats = await db.assessments.aggregate(pipeline).to_list(1000)
-    
-    # Enrich with student information
+    # Enrich with student information when assessments lack it
     students_dict = {}
-    students = await db.students.find({"class_id": class_id}).to_list(1000)
-    for student in students:
-        students_dict[student["id"]] = student
+    if missing_student_fields(student_stats):
+        students = await load_roster(class_id, teacher_id)
+        for student in students:
+            students_dict[student["id"]] = student
     
     student_details = []
     for stat in student_stats:
         student = students_dict.get(stat["_id"], {})
-        student_details.append({
-            "student_id": stat["_id"],
-            "student_name": student.get("name", ""),
-            "student_number": student.get("student_number", ""),
-            "correct": stat["correct"],
-            "wrong": stat["wrong"],
-            "total": stat["total"],
-            "correct_percentage": round((stat["correct"] / stat["total"]) * 100 if stat["total"] > 0 else 0, 2)
-        })
+        student_details.append(student_stat_details(stat, student))
     
     # Sort by student number
     student_details.sort(key=lambda x: x["student_number"])
@@ -504,6 +1252,339 @@ async def get_class_statistics(
         "student_details": student_details
     }
 
+@api_router.get("/classes/{class_id}/statistics")
+async def get_class_statistics(
+    class_id: str,
+    request: Request,
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    statistics = await cached_class_read(
+        "statistics", class_id, current_teacher.id,
+        lambda: compute_class_statistics(class_id, current_teacher.id)
+    )
+    return encode_response(request, statistics)
+
+async def load_ranked_stats(class_id: str, teacher_id: str):
+    # Every student is ranked, so the per-student counts are not capped, and
+    # students never assessed get zero counts
+    async def load():
+        await load_class(class_id, teacher_id)
+        student_stats = await repo.student_stats(class_id, limit=None)
+        assessed = {stat["_id"] for stat in student_stats}
+        ranked = list(student_stats)
+        async for batch in repo.stream_students(class_id):
+            ranked.extend(
+                {"_id": student["id"], "correct": 0, "wrong": 0, "total": 0,
+                 "student_name": student.get("name"), "student_number": student["student_number"]}
+                for student in batch if student["id"] not in assessed
+            )
+        return ranked
+
+    return await cached_class_read("ranked-stats", class_id, teacher_id, load)
+
+LEADERBOARD_METRICS = {
+    "correct": lambda stat: stat["correct"],
+    "wrong": lambda stat: stat["wrong"],
+    "total": lambda stat: stat["total"],
+    "correct_percentage": correct_percentage,
+}
+
+@api_router.get("/classes/{class_id}/leaderboard")
+async def get_class_leaderboard(
+    class_id: str,
+    metric: str = Query("correct_percentage"),
+    k: int = Query(10, ge=1, le=1000),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    if metric not in LEADERBOARD_METRICS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown metric, expected one of: {', '.join(LEADERBOARD_METRICS)}"
+        )
+    value = LEADERBOARD_METRICS[metric]
+    
+    student_stats = await load_ranked_stats(class_id, current_teacher.id)
+    
+    # Bounded selection in O(n log k); ties are broken by student id so the
+    # order is stable between calls
+    if order == "asc":
+        top = heapq.nsmallest(k, student_stats, key=lambda stat: (value(stat), stat["_id"]))
+    else:
+        top = heapq.nsmallest(k, student_stats, key=lambda stat: (-value(stat), stat["_id"]))
+    
+    # Only the selected students are enriched, and only if not migrated yet
+    students_dict = {}
+    if missing_student_fields(top):
+        students = await load_roster(class_id, current_teacher.id)
+        selected = {stat["_id"] for stat in top}
+        students_dict = {student["id"]: student for student in students if student["id"] in selected}
+    
+    return {
+        "metric": metric,
+        "order": order,
+        "k": k,
+        "students": [student_stat_details(stat, students_dict.get(stat["_id"], {})) for stat in top]
+    }
+
+async def load_history(class_id: str, teacher_id: str):
+    async def load():
+        # Check if class exists and belongs to teacher
+        await load_class(class_id, teacher_id)
+        columns = await repo.assessment_history(class_id)
+        return await asyncio.to_thread(ClassHistory.from_columns, columns)
+
+    return await cached_class_read("history", class_id, teacher_id, load)
+
+@api_router.get("/classes/{class_id}/analytics")
+async def get_class_analytics(
+    class_id: str,
+    request: Request,
+    window: int = Query(7, ge=1, le=365),  # days in the rolling accuracy window
+    recent: int = Query(10, ge=1, le=1000),  # answers in each student's recent accuracy
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    async def compute():
+        history = await load_history(class_id, current_teacher.id)
+        students = await load_roster(class_id, current_teacher.id)
+        # Vectorized, but still CPU work worth keeping off the event loop
+        return await asyncio.to_thread(participation_metrics, history, students, window, recent)
+
+    analytics = await cached_class_read(
+        f"analytics:{window}:{recent}", class_id, current_teacher.id, compute
+    )
+    return encode_response(request, analytics)
+
+@api_router.get("/classes/{class_id}/changes")
+async def get_class_changes(
+    class_id: str,
+    request: Request,
+    since: int = Query(0, ge=0),
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    await load_class(class_id, current_teacher.id)
+
+    if since == 0:
+        # Initial sync: the token is taken before loading, so anything written
+        # meanwhile is sent again on the next call rather than missed
+        token = await change_log.token(repo)
+        students = await load_roster(class_id, current_teacher.id)
+        assessments = await cached_class_read(
+            "assessments", class_id, current_teacher.id,
+            lambda: compute_class_assessments(class_id, current_teacher.id)
+        )
+        return encode_response(request, {
+            "token": token,
+            "reset": True,
+            "has_more": False,
+            "students": {"created": trusted_rows(Student, students), "updated": [], "deleted": []},
+            "assessments": {"created": assessments, "updated": [], "deleted": []},
+        })
+
+    try:
+        changes = await change_log.since(repo, class_id, since)
+    except ChangesExpired:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Sync token has expired, sync again from since=0"
+        )
+    return encode_response(request, changes)
+
+@api_router.post("/batch")
+async def run_batch(
+    batch_request: BatchRequest,
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    current_teacher: Teacher = Depends(get_current_teacher)
+):
+    # Sub-requests run concurrently through the whole app in-process, so
+    # they must not depend on each other's effects
+    headers = [
+        (b"authorization", f"Bearer {token}".encode("latin-1")),
+        (b"accept", b"application/json"),
+        (b"content-type", b"application/json"),
+    ]
+
+    async def run(item: BatchItem):
+        path, _, query = item.path.partition("?")
+        if path.rstrip("/") == "/batch":
+            return {"id": item.id, "status": 400, "body": {"detail": "Batches cannot be nested"}}
+        body = b"" if item.body is None else json.dumps(item.body).encode("utf-8")
+        try:
+            status_code, response_headers, content = await call_asgi(
+                request.app, item.method, api_router.prefix + path, query.encode("utf-8"), headers, body,
+                request.scope.get("client"), request.scope.get("server")
+            )
+        except Exception:
+            # Only this entry fails; the others are independent
+            logger.exception("Batch sub-request %s %s failed", item.method, item.path)
+            return {"id": item.id, "status": 500, "body": {"detail": "Internal Server Error"}}
+        return {"id": item.id, "status": status_code, "body": decode_body(response_headers, content)}
+
+    shared = batch_teacher.set((token, current_teacher))
+    try:
+        responses = await asyncio.gather(*(run(item) for item in batch_request.requests))
+    finally:
+        batch_teacher.reset(shared)
+    return encode_response(request, {"responses": responses})
+
+@api_router.get("/cache/stats")
+async def get_cache_stats(current_admin: Teacher = Depends(get_current_admin)):
+    return {**read_cache.stats(), "inflight": read_flights.inflight(), "invalidation": invalidation_bus.stats()}
+
+@api_router.get("/admin/logging")
+async def get_logging_stats(current_admin: Teacher = Depends(get_current_admin)):
+    return {"dropped_records": dropped_records()}
+
+@api_router.get("/admin/group-commit")
+async def get_group_commit_stats(current_admin: Teacher = Depends(get_current_admin)):
+    if assessment_writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **assessment_writer.stats()}
+
+@api_router.get("/admin/spool")
+async def get_spool_stats(current_admin: Teacher = Depends(get_current_admin)):
+    if assessment_spool is None:
+        return {"enabled": False}
+    return {"enabled": True, **assessment_spool.stats()}
+
+# Profiling routes. Settings changes, captured profiles, memory snapshots and
+# the slow query log below belong to the worker that serves the request; with
+# WEB_CONCURRENCY>1 run these diagnostics against a single-worker instance
+profiling_settings = ProfilingSettings(sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", 0)))
+# Requests carrying this token in X-Profile-Token are always profiled. Set
+# PROFILING_TOKEN so that every worker accepts the same one
+profiling_token = os.environ.get("PROFILING_TOKEN") or secrets.token_urlsafe(24)
+profile_store = ProfileStore()
+memory_snapshots = MemorySnapshots()
+
+@api_router.get("/admin/profiling")
+async def get_profiling_settings(current_admin: Teacher = Depends(get_current_admin)):
+    return {**profiling_settings.model_dump(), "token": profiling_token, "worker": os.getpid()}
+
+@api_router.put("/admin/profiling")
+async def update_profiling_settings(
+    settings: ProfilingSettings,
+    current_admin: Teacher = Depends(get_current_admin)
+):
+    global profiling_settings
+    profiling_settings = settings
+    return {**profiling_settings.model_dump(), "token": profiling_token, "worker": os.getpid()}
+
+@api_router.get("/admin/profiles")
+async def list_profiles(current_admin: Teacher = Depends(get_current_admin)):
+    return profile_store.list()
+
+@api_router.get("/admin/profiles/flamegraph", response_class=PlainTextResponse)
+async def get_merged_profile(
+    path: Optional[str] = None,
+    current_admin: Teacher = Depends(get_current_admin)
+):
+    return folded(profile_store.merged(path))
+
+@api_router.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, current_admin: Teacher = Depends(get_current_admin)):
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return folded(profile["stacks"])
+
+@api_router.delete("/admin/profiles")
+async def clear_profiles(current_admin: Teacher = Depends(get_current_admin)):
+    profile_store.clear()
+    return {"message": "Profiles cleared"}
+
+@api_router.post("/admin/memory/snapshots")
+async def take_memory_snapshot(current_admin: Teacher = Depends(get_current_admin)):
+    return await asyncio.to_thread(memory_snapshots.take)
+
+@api_router.get("/admin/memory/snapshots")
+async def list_memory_snapshots(current_admin: Teacher = Depends(get_current_admin)):
+    return memory_snapshots.list()
+
+@api_router.get("/admin/memory/diff")
+async def diff_memory_snapshots(
+    old: str,
+    new: str,
+    key_type: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    limit: int = Query(25, ge=1, le=500),
+    current_admin: Teacher = Depends(get_current_admin)
+):
+    stats = await asyncio.to_thread(memory_snapshots.diff, old, new, key_type, limit)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return stats
+
+@api_router.delete("/admin/memory")
+async def stop_memory_tracing(current_admin: Teacher = Depends(get_current_admin)):
+    memory_snapshots.stop()
+    return {"message": "Memory tracing stopped"}
+
+# Slow query routes
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(current_admin: Teacher = Depends(get_current_admin)):
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "worker": os.getpid(),
+        "queries": slow_query_log.entries()
+    }
+
+@api_router.delete("/admin/slow-queries")
+async def clear_slow_queries(current_admin: Teacher = Depends(get_current_admin)):
+    slow_query_log.clear()
+    return {"message": "Slow query log cleared"}
+
+# Probes
+@api_router.get("/healthz")
+async def healthz():
+    # The process is up and serving; says nothing about the database
+    return {"status": "ok"}
+
+@api_router.get("/readyz")
+async def readyz():
+    try:
+        await asyncio.wait_for(repo.ping(), READY_TIMEOUT)
+    except Exception as e:
+        logger.warning("Readiness check failed: %r", e)
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "unavailable", "storage": STORAGE_BACKEND}
+        )
+    return {"status": "ready", "storage": STORAGE_BACKEND}
+
+# Migration routes
+migration_runner = MigrationRunner(MIGRATIONS)
+# Keep references to running migrations so they are not garbage collected
+migration_tasks = set()
+
+def require_mongo():
+    if db is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Migrations are only available with the mongo storage backend"
+        )
+
+def start_migration(name: str = None):
+    if name is None:
+        task = asyncio.create_task(migration_runner.run_all(db))
+    else:
+        task = asyncio.create_task(migration_runner.run(db, name))
+    migration_tasks.add(task)
+    task.add_done_callback(migration_tasks.discard)
+
+@api_router.get("/admin/migrations")
+async def get_migrations(current_admin: Teacher = Depends(get_current_admin)):
+    require_mongo()
+    return await migration_runner.status(db)
+
+@api_router.post("/admin/migrations/{name}/run", status_code=status.HTTP_202_ACCEPTED)
+async def run_migration(name: str, current_admin: Teacher = Depends(get_current_admin)):
+    require_mongo()
+    if name not in migration_runner.migrations:
+        raise HTTPException(status_code=404, detail="Migration not found")
+    start_migration(name)
+    return {"message": f"Migration {name} started"}
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -515,13 +1596,106 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
+# Only one request is profiled at a time: they all run on the event loop
+# thread, so overlapping samplers would record the same stacks twice
+profiler_active = False
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    global profiler_active
+    flagged = secrets.compare_digest(request.headers.get("x-profile-token", ""), profiling_token)
+    sampled = profiling_settings.sample_rate > 0 and random.random() < profiling_settings.sample_rate
+    if profiler_active or not (flagged or sampled):
+        return await call_next(request)
+
+    profiler_active = True
+    profiler = SamplingProfiler(threading.get_ident(), profiling_settings.interval_ms / 1000)
+    start = time.perf_counter()
+    profiler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        stacks = profiler.stop()
+        profiler_active = False
+    profile = profile_store.add(
+        request.method, request.url.path, (time.perf_counter() - start) * 1000, stacks
+    )
+    response.headers["X-Profile-Id"] = profile["id"]
+    return response
+
+@app.middleware("http")
+async def log_requests(request: Request, call_next):
+    context = {"request_id": uuid.uuid4().hex, "method": request.method, "path": request.url.path}
+    token = request_context.set(context)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Routing fills in the matched route and path parameters on the scope
+        route = request.scope.get("route")
+        if route is not None:
+            context["route"] = route.path
+        class_id = request.scope.get("path_params", {}).get("class_id")
+        if class_id:
+            context["class_id"] = class_id
+        context["status"] = status_code
+        context["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        access_logger.info("request")
+        request_context.reset(token)
+
+# Configure logging: records are queued and written in batches by a
+# background thread, so logging never blocks the event loop
+configure_logging(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    json_format=os.environ.get("LOG_FORMAT", "json") == "json",
+    queue_size=int(os.environ.get("LOG_QUEUE_SIZE", 10000)),
+    batch_size=int(os.environ.get("LOG_BATCH_SIZE", 256))
 )
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("access")
+
+async def trim_change_log():
+    while True:
+        try:
+            await change_log.trim(repo, datetime.utcnow() - timedelta(days=CHANGES_RETENTION_DAYS))
+        except Exception:
+            logger.warning("Could not trim the change log", exc_info=True)
+        await asyncio.sleep(CHANGES_TRIM_SECONDS)
+
+change_log_trimmer: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def create_indexes():
+    global change_log_trimmer
+    open_storage()
+    await invalidation_bus.start(bump_scope, bump_all_scopes)
+    await repo.initialize()
+    change_log_trimmer = asyncio.create_task(trim_change_log())
+    if assessment_spool is not None:
+        await assessment_spool.start()
+    if db is None:
+        return
+    slow_query_log.attach(client, asyncio.get_running_loop())
+    if os.environ.get("RUN_MIGRATIONS", "1") == "1":
+        # Online backfills run in the background and resume where they stopped
+        start_migration()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    # Write batched assessments before the connection goes away
+    if assessment_writer is not None:
+        await assessment_writer.close()
+    if assessment_spool is not None:
+        await assessment_spool.close()
+    await invalidation_bus.close()
+    if change_log_trimmer is not None:
+        change_log_trimmer.cancel()
+    await change_log.close(repo)
+    await repo.close()
+
+@app.on_event("shutdown")
+async def flush_logs():
+    shutdown_logging()
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Commands whose plans can be inspected with explain
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "delete", "update", "findAndModify"}
+
+# Fields that carry the query shape of each command
+SHAPE_FIELDS = ("filter", "query", "pipeline", "sort", "projection", "key", "deletes", "updates")
+
+# Driver/session fields that explain rejects or that do not affect the plan
+EXPLAIN_DROP_FIELDS = {"lsid", "txnNumber", "writeConcern", "readConcern", "apiVersion", "apiStrict", "apiDeprecationErrors"}
+
+
+def redact(value: Any) -> Any:
+    """Replace every literal in a filter with "?", keeping keys and operators."""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        redacted = [redact(item) for item in value]
+        # Collapse lists of literals, e.g. $in arrays, to a single placeholder
+        if redacted and all(item == "?" for item in redacted):
+            return ["?"]
+        return redacted
+    return "?"
+
+
+def redact_plan(plan: Any) -> Any:
+    # Plans echo the literal filter values back; keep only their shape
+    if isinstance(plan, dict):
+        return {
+            key: redact(value) if key in ("filter", "parsedQuery", "indexBounds") else redact_plan(value)
+            for key, value in plan.items()
+        }
+    if isinstance(plan, list):
+        return [redact_plan(item) for item in plan]
+    return plan
+
+
+def winning_plan(explain: Dict[str, Any]) -> Dict[str, Any]:
+    planner = explain.get("queryPlanner")
+    if planner is None:
+        # Aggregations report the plan of their leading $cursor stage
+        for stage in explain.get("stages", []):
+            if "$cursor" in stage:
+                planner = stage["$cursor"].get("queryPlanner")
+                break
+    return (planner or {}).get("winningPlan", {})
+
+
+def plan_stages(plan: Any) -> List[str]:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Record commands slower than a threshold and explain each shape once.
+
+    Registered as a pymongo command listener. Callbacks run on driver
+    threads, so shared state is guarded by a lock and explains are handed to
+    the application's event loop.
+    """
+
+    def __init__(self, threshold_ms: float = 100, max_shapes: int = 500):
+        self.threshold_ms = threshold_ms
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+        self._started: Dict[Any, Dict[str, Any]] = {}
+        self._shapes: Dict[str, Dict[str, Any]] = {}
+        self._client = None
+        self._loop = None
+
+    def attach(self, client, loop: asyncio.AbstractEventLoop):
+        self._client = client
+        self._loop = loop
+
+    def started(self, event):
+        if event.command_name not in EXPLAINABLE:
+            return
+        with self._lock:
+            self._started[(event.connection_id, event.request_id)] = {
+                "command": event.command,
+                "database": event.database_name,
+            }
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        with self._lock:
+            started = self._started.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < self.threshold_ms:
+            return
+        self._record(event.command_name, started["database"], started["command"], duration_ms)
+
+    def _record(self, command_name: str, database: str, command: Dict[str, Any], duration_ms: float):
+        collection = command.get(command_name)
+        shape = {"command": command_name, "collection": collection}
+        for field in SHAPE_FIELDS:
+            if field in command:
+                shape[field] = redact(command[field])
+        key = json.dumps(shape, sort_keys=True, default=str)
+
+        with self._lock:
+            entry = self._shapes.get(key)
+            if entry is None:
+                if len(self._shapes) >= self.max_shapes:
+                    return
+                entry = self._shapes[key] = {
+                    "shape": shape,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "first_seen": datetime.utcnow(),
+                    "explain": None,
+                }
+                explain = True
+            else:
+                explain = False
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_seen"] = datetime.utcnow()
+
+        if explain and self._client is not None and self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._explain(key, database, command), self._loop)
+
+    async def _explain(self, key: str, database: str, command: Dict[str, Any]):
+        explainable = {
+            field: value for field, value in command.items()
+            if not field.startswith("$") and field not in EXPLAIN_DROP_FIELDS
+        }
+        try:
+            result = await self._client[database].command(
+                {"explain": explainable, "verbosity": "queryPlanner"}
+            )
+            plan = winning_plan(result)
+            stages = plan_stages(plan)
+            explain = {
+                "stages": stages,
+                "collection_scan": "COLLSCAN" in stages,
+                "winning_plan": json.loads(json.dumps(redact_plan(plan), default=str)),
+            }
+        except Exception as e:
+            logger.warning("Could not explain slow query: %s", e)
+            explain = {"error": str(e)}
+        with self._lock:
+            if key in self._shapes:
+                self._shapes[key]["explain"] = explain
+
+    def entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = [
+                {**entry, "avg_ms": round(entry["total_ms"] / entry["count"], 2)}
+                for entry in self._shapes.values()
+            ]
+        return sorted(entries, key=lambda entry: entry["total_ms"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._shapes.clear()
@@ -0,0 +1,119 @@
+import gzip
+import json
+import uuid
+import zlib
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Tuple
+
+FORMAT = "participation-snapshot"
+VERSION = 1
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _object_hook(obj):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+class SnapshotWriter:
+    """Encode snapshot records as gzip-compressed JSON lines, piece by piece.
+
+    A snapshot is a header record, the class, its students, its
+    assessments and an end record with the counts, so an import can tell a
+    complete archive from a truncated one. ``write`` returns whatever
+    compressed bytes are ready; ``close`` returns the rest.
+    """
+
+    def __init__(self, level: int = 6):
+        # wbits=31 writes a gzip container, readable with gunzip
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        self.counts = {"student": 0, "assessment": 0}
+
+    def header(self, class_item: Dict[str, Any]) -> bytes:
+        return self.write([
+            {"type": "header", "format": FORMAT, "version": VERSION, "exported_at": datetime.utcnow()},
+            {"type": "class", "doc": class_item},
+        ])
+
+    def documents(self, kind: str, docs: List[Dict[str, Any]]) -> bytes:
+        self.counts[kind] += len(docs)
+        return self.write({"type": kind, "doc": doc} for doc in docs)
+
+    def write(self, records: Iterable[Dict[str, Any]]) -> bytes:
+        data = b"".join(
+            json.dumps(record, default=_default, separators=(",", ":")).encode("utf-8") + b"\n"
+            for record in records
+        )
+        return self._compressor.compress(data)
+
+    def close(self) -> bytes:
+        end = self.write([{"type": "end", "students": self.counts["student"], "assessments": self.counts["assessment"]}])
+        return end + self._compressor.flush()
+
+
+def iter_snapshot(fileobj: BinaryIO, class_id: str, teacher_id: str,
+                  batch_size: int = 1000) -> Iterator[Tuple[str, Any]]:
+    """Read a snapshot, yielding ("class", doc), then ("student", batch)
+    and ("assessment", batch) pairs ready to insert.
+
+    Every document gets a new id and the given class and teacher ids;
+    assessments follow their students to the new ids. Raises ValueError
+    for anything but a complete snapshot.
+    """
+    student_ids: Dict[str, str] = {}
+    counts = {"student": 0, "assessment": 0}
+    batch: List[Dict[str, Any]] = []
+    batch_kind = None
+    seen_class = False
+    ended = False
+    with gzip.GzipFile(fileobj=fileobj, mode="rb") as stream:
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            if ended:
+                raise ValueError("Snapshot has records after its end")
+            record = json.loads(line, object_hook=_object_hook)
+            kind = record.get("type")
+            if number == 1:
+                if kind != "header" or record.get("format") != FORMAT:
+                    raise ValueError("Not a class snapshot")
+                if record.get("version") != VERSION:
+                    raise ValueError(f"Unsupported snapshot version {record.get('version')}")
+                continue
+            if kind == "class":
+                seen_class = True
+                yield "class", {**record["doc"], "id": class_id, "teacher_id": teacher_id}
+                continue
+            if kind in counts:
+                if not seen_class:
+                    raise ValueError("Snapshot is missing its class")
+                doc = dict(record["doc"], id=str(uuid.uuid4()), class_id=class_id, teacher_id=teacher_id)
+                if kind == "student":
+                    student_ids[record["doc"]["id"]] = doc["id"]
+                else:
+                    # Assessments of students removed before the export keep
+                    # their history under a new id of their own
+                    doc["student_id"] = student_ids.setdefault(doc["student_id"], str(uuid.uuid4()))
+                if batch and (kind != batch_kind or len(batch) >= batch_size):
+                    yield batch_kind, batch
+                    batch = []
+                batch_kind = kind
+                batch.append(doc)
+                counts[kind] += 1
+                continue
+            if kind == "end":
+                if (record.get("students"), record.get("assessments")) != (counts["student"], counts["assessment"]):
+                    raise ValueError("Snapshot counts do not match its contents")
+                ended = True
+                continue
+            raise ValueError(f"Unknown snapshot record type {kind!r}")
+    if not ended:
+        raise ValueError("Snapshot is truncated")
+    if batch:
+        yield batch_kind, batch
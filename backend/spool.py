@@ -0,0 +1,348 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _fsync_replace(path: str, data: bytes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Journal:
+    """One append-only JSON-lines file with a replay offset checkpoint.
+
+    The file is locked with flock for as long as a process owns it, so a
+    journal whose lock can be taken belongs to a process that is gone.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset_path = f"{path}.offset"
+        self.fd: Optional[int] = None
+        self.offset = 0
+
+    def open(self, blocking: bool = True) -> bool:
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(self.fd)
+            self.fd = None
+            return False
+        try:
+            with open(self.offset_path, "rb") as f:
+                self.offset = int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            self.offset = 0
+        size = os.fstat(self.fd).st_size
+        if self.offset > size:
+            self.offset = 0
+        self._drop_torn_tail(size)
+        return True
+
+    def _drop_torn_tail(self, size: int):
+        # A crash during an append can leave a partial last line; it was
+        # never acknowledged, so it is discarded
+        if size == 0:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(max(size - 65536, 0))
+            tail = f.read()
+        if tail.endswith(b"\n"):
+            return
+        end = tail.rfind(b"\n")
+        keep = size - len(tail) + end + 1 if end >= 0 else (0 if size <= 65536 else size)
+        os.ftruncate(self.fd, max(keep, self.offset))
+
+    def append(self, data: bytes):
+        os.write(self.fd, data)
+        os.fsync(self.fd)
+
+    def size(self) -> int:
+        return os.fstat(self.fd).st_size
+
+    def read(self, max_bytes: int) -> Tuple[bytes, int]:
+        """Complete lines after the offset, and the offset past them."""
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(max_bytes)
+        end = data.rfind(b"\n")
+        if end < 0:
+            return b"", self.offset
+        return data[:end + 1], self.offset + end + 1
+
+    def commit(self, offset: int):
+        _fsync_replace(self.offset_path, str(offset).encode())
+        self.offset = offset
+
+    def reset(self):
+        # Fully replayed: start the file over. The offset is cleared first,
+        # so a crash in between only replays entries again
+        self.commit(0)
+        os.ftruncate(self.fd, 0)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def remove(self):
+        self.close()
+        for path in (self.path, self.offset_path):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+class DurableSpool:
+    """Acknowledge writes once they are fsync'd to a local journal.
+
+    ``append`` returns when the document is durable on local disk;
+    appends that arrive while an fsync is in progress share the next one.
+    A background task replays the journal in order through ``replay``,
+    which must be idempotent: entries are replayed again after a crash
+    between a replay and its checkpoint. Journals left behind by dead
+    processes in the same directory are replayed at startup.
+
+    Lines that cannot be decoded, and the first entry that still fails on
+    its own once a batch has failed ``max_attempts`` times, are moved to
+    ``<journal>.rejected`` so one bad entry does not hold up the rest.
+    """
+
+    def __init__(self, directory: str, replay: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+                 datetime_fields: Sequence[str] = (), batch_bytes: int = 1024 * 1024,
+                 poll_interval: float = 1.0, max_backoff: float = 30.0, max_attempts: int = 10):
+        self.directory = directory
+        self.replay = replay
+        self.datetime_fields = tuple(datetime_fields)
+        self.batch_bytes = batch_bytes
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.journal: Optional[Journal] = None
+        self._buffer: List[tuple] = []
+        self._flushing: Optional[asyncio.Task] = None
+        self._file_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._replayer: Optional[asyncio.Task] = None
+        self._closing = False
+        # Consecutive replay failures at the current offset
+        self._attempts = 0
+        self.appended = 0
+        self.replayed = 0
+        self.rejected = 0
+        self.recovered_journals = 0
+        self.last_error: Optional[str] = None
+
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.journal = Journal(os.path.join(self.directory, f"journal-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"))
+        await asyncio.to_thread(self.journal.open)
+        self._replayer = asyncio.create_task(self._run())
+
+    def encode(self, doc: Dict[str, Any]) -> bytes:
+        return (json.dumps(doc, default=_default, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def decode(self, line: bytes) -> Dict[str, Any]:
+        doc = json.loads(line)
+        if not isinstance(doc, dict):
+            raise ValueError("Spool entry is not an object")
+        for field in self.datetime_fields:
+            if isinstance(doc.get(field), str):
+                doc[field] = datetime.fromisoformat(doc[field])
+        return doc
+
+    async def append(self, doc: Dict[str, Any]):
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append((self.encode(doc), future))
+        if self._flushing is None:
+            self._flushing = asyncio.create_task(self._flush())
+        await future
+
+    async def _flush(self):
+        try:
+            while self._buffer:
+                batch, self._buffer = self._buffer, []
+                try:
+                    async with self._file_lock:
+                        await asyncio.to_thread(self.journal.append, b"".join(line for line, _ in batch))
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.appended += len(batch)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+                self._wake.set()
+        finally:
+            self._flushing = None
+
+    def _entries(self, data: bytes, offset: int) -> List[tuple]:
+        """(line, offset past it, document, decode error) per line."""
+        entries = []
+        for line in data.splitlines(keepends=True):
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                entries.append((line, offset, self.decode(line), None))
+            except ValueError as e:
+                entries.append((line, offset, None, e))
+        return entries
+
+    def _write_rejected(self, journal: Journal, rejected: List[tuple]):
+        if not rejected:
+            return
+        path = f"{journal.path}.rejected"
+        with open(path, "ab") as f:
+            for line, _ in rejected:
+                f.write(line if line.endswith(b"\n") else line + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        for _, error in rejected:
+            logger.error("Spool entry moved to %s: %s", path, error)
+        self.rejected += len(rejected)
+
+    async def _replay_journal(self, journal: Journal) -> bool:
+        """Replay everything after the offset; False if replay failed."""
+        while True:
+            data, offset = await asyncio.to_thread(journal.read, self.batch_bytes)
+            if not data:
+                return True
+            entries = self._entries(data, journal.offset)
+            if self._attempts < self.max_attempts:
+                docs = [doc for _, _, doc, error in entries if error is None]
+                try:
+                    if docs:
+                        await self.replay(docs)
+                except Exception as e:
+                    self._attempts += 1
+                    self.last_error = str(e)
+                    logger.warning("Spool replay failed, will retry: %s", e)
+                    return False
+                self.replayed += len(docs)
+                rejected = [(line, error) for line, _, _, error in entries if error is not None]
+            else:
+                # The batch keeps failing: replay it one entry at a time and
+                # set aside the first entry that fails on its own
+                rejected = []
+                for line, end, doc, error in entries:
+                    if error is not None:
+                        rejected.append((line, error))
+                        continue
+                    try:
+                        await self.replay([doc])
+                    except Exception as e:
+                        rejected.append((line, e))
+                        offset = end
+                        break
+                    self.replayed += 1
+            await asyncio.to_thread(self._write_rejected, journal, rejected)
+            self._attempts = 0
+            self.last_error = None
+            await asyncio.to_thread(journal.commit, offset)
+
+    async def _recover_orphans(self) -> bool:
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".jsonl") or path == self.journal.path:
+                continue
+            orphan = Journal(path)
+            if not await asyncio.to_thread(orphan.open, False):
+                continue  # owned by a live process
+            try:
+                if not await self._replay_journal(orphan):
+                    return False
+                await asyncio.to_thread(orphan.remove)
+                self.recovered_journals += 1
+                logger.info("Recovered spool journal %s", name)
+            finally:
+                orphan.close()
+        return True
+
+    async def _run(self):
+        backoff = self.poll_interval
+        recovered = False
+        while True:
+            # Cleared before reading, so an append during the replay wakes
+            # the next round instead of waiting for the poll interval
+            self._wake.clear()
+            try:
+                ok = recovered = recovered or await self._recover_orphans()
+                if ok:
+                    ok = await self._replay_journal(self.journal)
+                if ok:
+                    async with self._file_lock:
+                        if self.journal.offset and self.journal.offset == self.journal.size():
+                            await asyncio.to_thread(self.journal.reset)
+            except Exception as e:
+                # Keep replaying later writes whatever went wrong here
+                logger.exception("Spool replay round failed")
+                self.last_error = str(e)
+                ok = False
+            if self._closing:
+                return
+            if ok:
+                backoff = self.poll_interval
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                # Back off while the database is failing, whatever the appends
+                backoff = min(backoff * 2, self.max_backoff)
+                await asyncio.sleep(backoff)
+
+    def pending_bytes(self) -> int:
+        if self.journal is None or self.journal.fd is None:
+            return 0
+        return self.journal.size() - self.journal.offset
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "journal": self.journal.path if self.journal else None,
+            "appended": self.appended,
+            "replayed": self.replayed,
+            "pending_bytes": self.pending_bytes(),
+            "recovered_journals": self.recovered_journals,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+        }
+
+    async def close(self, timeout: float = 10.0):
+        """Wait for pending appends, then make a last attempt to drain."""
+        if self._flushing is not None:
+            await self._flushing
+        self._closing = True
+        if self._replayer is not None:
+            self._wake.set()
+            try:
+                await asyncio.wait_for(self._replayer, timeout)
+            except asyncio.TimeoutError:
+                self._replayer.cancel()
+        # Whatever is left stays in the journal and is recovered on restart
+        if self.journal is not None:
+            if self.pending_bytes() == 0:
+                self.journal.remove()
+            else:
+                self.journal.close()
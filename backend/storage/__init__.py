@@ -0,0 +1,6 @@
+from .base import LIST_LIMIT, STUDENT_SORTS, PartialWrite, Repository
+from .memory import MemoryRepository
+from .mongo import MongoRepository
+
+# SQLRepository lives in storage.sql and is imported on demand, so the
+# Mongo and in-memory backends do not need SQLAlchemy installed
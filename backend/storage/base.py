@@ -0,0 +1,255 @@
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Upper bound on the documents returned by one list call
+LIST_LIMIT = 1000
+
+# Orders accepted by search_students
+STUDENT_SORTS = ("name", "student_number", "participation")
+
+
+def copy_ids(source_ids: Iterable[str]) -> Dict[str, str]:
+    """A fresh uuid4 for each source id, keyed by the source id."""
+    return {source_id: str(uuid.uuid4()) for source_id in source_ids}
+
+
+class PartialWrite(Exception):
+    """Some documents of a batch insert were not stored; the others were.
+
+    ``failed`` maps the index of each document that was not stored to the
+    reason.
+    """
+
+    def __init__(self, failed: Dict[int, str]):
+        super().__init__(f"{len(failed)} documents were not stored")
+        self.failed = failed
+
+
+class Repository(ABC):
+    """Storage operations used by the API handlers.
+
+    Documents are plain dicts shaped like the MongoDB documents the app has
+    always stored (``id``, ``class_id``, ``teacher_id``, ...), without any
+    backend-specific fields such as Mongo's ``_id``. Implementations must
+    not return objects that callers could mutate into the store.
+
+    List methods taking ``fields`` read only those fields when given, so
+    unneeded ones never leave the database; documents may still carry
+    fields the backend needed for filtering or ordering.
+    """
+
+    name = "base"
+
+    async def initialize(self):
+        """Create indexes or tables. Safe to call on every startup."""
+
+    async def close(self):
+        """Release connections."""
+
+    async def ping(self):
+        """Raise if the database cannot be reached."""
+
+    # Teachers
+
+    @abstractmethod
+    async def get_teacher_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def create_teacher(self, teacher: Dict[str, Any]):
+        ...
+
+    # Classes
+
+    @abstractmethod
+    async def create_class(self, class_item: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    async def list_classes(self, teacher_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def get_class(self, class_id: str, teacher_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def delete_class(self, class_id: str, teacher_id: str) -> bool:
+        """Delete a class with its students and assessments."""
+
+    # Students
+
+    @abstractmethod
+    async def insert_students(self, students: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    async def list_students(self, class_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def get_student(self, class_id: str, student_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def copy_students(self, source_class_id: str, target_class_id: str,
+                            student_ids: Optional[List[str]] = None,
+                            include_history: bool = False) -> List[Dict[str, Any]]:
+        """Copy students into another class of the same teacher and return the copies.
+
+        Copies every student of the class when ``student_ids`` is None, and
+        their assessments too with ``include_history``. Every copy gets a
+        fresh uuid4 id.
+        """
+
+    @abstractmethod
+    async def move_students(self, source_class_id: str, target_class_id: str,
+                            student_ids: List[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Move students and their assessments to another class, keeping ids.
+
+        Returns the moved students and assessments.
+        """
+
+    @abstractmethod
+    async def search_students(self, class_ids: List[str], prefix: Optional[str] = None, sort: Optional[str] = "name",
+                              descending: bool = False, unassessed: bool = False,
+                              offset: int = 0, limit: int = LIST_LIMIT,
+                              fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Students of the classes whose name or student number starts with ``prefix``.
+
+        Matching and ordering ignore case. ``sort`` is one of STUDENT_SORTS,
+        "participation" ordering by number of assessments and then by name,
+        or None for insertion order; with ``unassessed`` only students never
+        assessed are returned.
+        """
+
+    @abstractmethod
+    def stream_students(self, class_id: str, batch_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """All students of the class, in batches, without holding them all in memory."""
+
+    @abstractmethod
+    async def count_students(self, class_id: str) -> int:
+        ...
+
+    @abstractmethod
+    async def update_student(self, class_id: str, student_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Update a student and the student fields denormalized onto its assessments."""
+
+    @abstractmethod
+    async def delete_students(self, class_id: str) -> int:
+        """Delete every student of a class and their assessments."""
+
+    # Assessments
+
+    @abstractmethod
+    async def insert_assessments(self, assessments: List[Dict[str, Any]]):
+        """Insert the assessments; raises PartialWrite if only some were stored."""
+
+    @abstractmethod
+    async def save_assessments(self, assessments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert the assessments whose id is not stored yet and return those."""
+
+    @abstractmethod
+    async def list_assessments(self, class_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    async def list_student_assessments(self, class_id: str, student_id: str) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def stream_assessments(self, class_id: str, batch_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """All assessments of the class, in batches, without holding them all in memory."""
+
+    @abstractmethod
+    async def assessment_history(self, class_id: str) -> Dict[str, List[Any]]:
+        """Every assessment of a class as student_id, date and score columns, in date order."""
+
+    @abstractmethod
+    async def least_assessed_students(self, class_id: str) -> List[Dict[str, Any]]:
+        """Students of a class that have the fewest assessments."""
+
+    @abstractmethod
+    async def class_counts(self, teacher_id: str) -> Dict[str, Dict[str, Any]]:
+        """Figures of each of the teacher's classes that has students or assessments.
+
+        Maps class id to total_students, total_assessments, correct_answers,
+        wrong_answers and last_activity (date of the latest assessment).
+        """
+
+    @abstractmethod
+    async def student_stats(self, class_id: str, limit: Optional[int] = LIST_LIMIT) -> List[Dict[str, Any]]:
+        """Per assessed student: _id, correct, wrong, total, student_name, student_number.
+
+        A limit of None returns every assessed student.
+        """
+
+    @abstractmethod
+    async def assessment_totals(self, class_id: str) -> Dict[str, int]:
+        """assessed_students, correct and wrong counts for a class."""
+
+    # Import jobs
+
+    @abstractmethod
+    async def create_import_job(self, job: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    async def update_import_job(self, job_id: str, fields: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    async def get_import_job(self, job_id: str, teacher_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    # Change log
+
+    @abstractmethod
+    async def allocate_seq(self, count: int) -> int:
+        """Reserve count sequence numbers and return the last one."""
+
+    @abstractmethod
+    async def current_seq(self) -> int:
+        ...
+
+    @abstractmethod
+    async def set_change_lease(self, owner: str, low: int, expires_at: datetime):
+        """Record that owner may still write entries numbered low or above."""
+
+    @abstractmethod
+    async def drop_change_lease(self, owner: str):
+        ...
+
+    @abstractmethod
+    async def change_bounds(self, now: datetime) -> Tuple[int, int]:
+        """The trimmed floor and the watermark of the log.
+
+        Entries at or below the floor may be gone. The watermark is the
+        highest seq at or below which every allocated entry is written: the
+        counter is read before the leases, and a worker stores its lease
+        before it allocates, so any number at or below the counter value
+        read here is either written already or covered by a lease that has
+        not expired at now.
+        """
+
+    @abstractmethod
+    async def trim_changes(self, before: datetime):
+        """Raise the floor to the newest entry logged before ``before``.
+
+        Entries at or below the previous floor are deleted first, so a sync
+        that read the floor just before it moved still finds its entries.
+        """
+
+    @abstractmethod
+    async def append_changes(self, changes: List[Dict[str, Any]]):
+        ...
+
+    @abstractmethod
+    async def list_changes(self, class_id: str, since: int, limit: int) -> List[Dict[str, Any]]:
+        """Changes of a class with seq greater than since, in seq order."""
+
+    @abstractmethod
+    async def delete_changes(self, class_id: str, before_seq: Optional[int] = None):
+        ...
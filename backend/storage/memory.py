@@ -0,0 +1,329 @@
+import bisect
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .base import LIST_LIMIT, Repository, copy_ids
+
+
+def _pick(doc: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return dict(doc)
+    return {field: doc[field] for field in fields if field in doc}
+
+
+class MemoryRepository(Repository):
+    """Process-local repository backed by dicts.
+
+    Nothing is persisted and nothing is shared between workers, so it suits
+    tests and single-process deployments. Methods never await, which makes
+    each of them atomic with respect to the event loop.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self.teachers: Dict[str, Dict[str, Any]] = {}  # by email
+        self.classes: Dict[str, Dict[str, Any]] = {}
+        self.students: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)  # class id -> student id -> doc
+        self.assessments: Dict[str, List[Dict[str, Any]]] = defaultdict(list)  # class id -> docs in insert order
+        self.import_jobs: Dict[str, Dict[str, Any]] = {}
+        self.changes: Dict[str, List[Dict[str, Any]]] = defaultdict(list)  # class id -> entries in seq order
+        self.seq = 0
+        self.changes_floor = 0
+        self.change_leases: Dict[str, Tuple[int, datetime]] = {}  # owner -> (low, expires at)
+
+    # Teachers
+
+    async def get_teacher_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        teacher = self.teachers.get(email)
+        return dict(teacher) if teacher else None
+
+    async def create_teacher(self, teacher: Dict[str, Any]):
+        self.teachers[teacher["email"]] = dict(teacher)
+
+    # Classes
+
+    async def create_class(self, class_item: Dict[str, Any]):
+        self.classes[class_item["id"]] = dict(class_item)
+
+    async def list_classes(self, teacher_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        classes = [_pick(item, fields) for item in self.classes.values() if item["teacher_id"] == teacher_id]
+        return classes[:LIST_LIMIT]
+
+    async def get_class(self, class_id: str, teacher_id: str) -> Optional[Dict[str, Any]]:
+        class_item = self.classes.get(class_id)
+        if class_item is None or class_item["teacher_id"] != teacher_id:
+            return None
+        return dict(class_item)
+
+    async def delete_class(self, class_id: str, teacher_id: str) -> bool:
+        if await self.get_class(class_id, teacher_id) is None:
+            return False
+        del self.classes[class_id]
+        self.students.pop(class_id, None)
+        self.assessments.pop(class_id, None)
+        return True
+
+    # Students
+
+    async def insert_students(self, students: List[Dict[str, Any]]):
+        for student in students:
+            self.students[student["class_id"]][student["id"]] = dict(student)
+
+    async def list_students(self, class_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        students = self.students.get(class_id, {})
+        return [_pick(student, fields) for _, student in zip(range(LIST_LIMIT), students.values())]
+
+    async def get_student(self, class_id: str, student_id: str) -> Optional[Dict[str, Any]]:
+        student = self.students.get(class_id, {}).get(student_id)
+        return dict(student) if student else None
+
+    async def copy_students(self, source_class_id: str, target_class_id: str,
+                            student_ids: Optional[List[str]] = None,
+                            include_history: bool = False) -> List[Dict[str, Any]]:
+        now = datetime.utcnow()
+        source = self.students.get(source_class_id, {})
+        # Each student once, like the other backends
+        selected = source.keys() if student_ids is None else [id_ for id_ in dict.fromkeys(student_ids) if id_ in source]
+        ids = copy_ids(selected)
+        copies = [
+            {**source[student_id], "id": ids[student_id], "class_id": target_class_id, "created_at": now}
+            for student_id in selected
+        ]
+        if include_history:
+            self.assessments[target_class_id].extend(
+                {**assessment, "id": str(uuid.uuid4()), "class_id": target_class_id,
+                 "student_id": ids[assessment["student_id"]]}
+                for assessment in self.assessments.get(source_class_id, [])
+                if assessment["student_id"] in ids
+            )
+        await self.insert_students(copies)
+        return copies
+
+    async def move_students(self, source_class_id: str, target_class_id: str,
+                            student_ids: List[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        source = self.students.get(source_class_id, {})
+        moved = [source.pop(student_id) for student_id in student_ids if student_id in source]
+        for student in moved:
+            student["class_id"] = target_class_id
+            self.students[target_class_id][student["id"]] = student
+        moving = {student["id"] for student in moved}
+        kept = []
+        moved_assessments = []
+        for assessment in self.assessments.get(source_class_id, []):
+            if assessment["student_id"] in moving:
+                assessment["class_id"] = target_class_id
+                moved_assessments.append(assessment)
+            else:
+                kept.append(assessment)
+        if moved_assessments:
+            self.assessments[source_class_id] = kept
+            self.assessments[target_class_id].extend(moved_assessments)
+        return [dict(student) for student in moved], [dict(assessment) for assessment in moved_assessments]
+
+    async def search_students(self, class_ids: List[str], prefix: Optional[str] = None, sort: Optional[str] = "name",
+                              descending: bool = False, unassessed: bool = False,
+                              offset: int = 0, limit: int = LIST_LIMIT,
+                              fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        counts: Dict[str, int] = defaultdict(int)
+        for class_id in class_ids:
+            for assessment in self.assessments.get(class_id, []):
+                counts[assessment["student_id"]] += 1
+        prefix = prefix.casefold() if prefix else None
+        found = []
+        for class_id in class_ids:
+            for student in self.students.get(class_id, {}).values():
+                if prefix and not ((student.get("name") or "").casefold().startswith(prefix)
+                                   or student["student_number"].casefold().startswith(prefix)):
+                    continue
+                if unassessed and counts[student["id"]]:
+                    continue
+                found.append(student)
+
+        def text(student, field):
+            return (student.get(field) or "").casefold()
+
+        if sort == "student_number":
+            found.sort(key=lambda student: (text(student, "student_number"), text(student, "name")), reverse=descending)
+        elif sort is not None:
+            found.sort(key=lambda student: (text(student, "name"), text(student, "student_number")),
+                       reverse=descending and sort == "name")
+        if sort == "participation":
+            # Stable, so students with the same count stay in name order
+            found.sort(key=lambda student: counts[student["id"]], reverse=descending)
+        return [_pick(student, fields) for student in found[offset:offset + limit]]
+
+    async def stream_students(self, class_id: str, batch_size: int = 1000):
+        students = list(self.students.get(class_id, {}).values())
+        for start in range(0, len(students), batch_size):
+            yield [dict(student) for student in students[start:start + batch_size]]
+
+    async def count_students(self, class_id: str) -> int:
+        return len(self.students.get(class_id, {}))
+
+    async def update_student(self, class_id: str, student_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        student = self.students.get(class_id, {}).get(student_id)
+        if student is None:
+            return None
+        student.update(fields)
+        for assessment in self.assessments.get(class_id, []):
+            if assessment["student_id"] == student_id:
+                assessment["student_name"] = student.get("name")
+                assessment["student_number"] = student.get("student_number")
+        return dict(student)
+
+    async def delete_students(self, class_id: str) -> int:
+        deleted = len(self.students.pop(class_id, {}))
+        self.assessments.pop(class_id, None)
+        return deleted
+
+    # Assessments
+
+    async def insert_assessments(self, assessments: List[Dict[str, Any]]):
+        for assessment in assessments:
+            self.assessments[assessment["class_id"]].append(dict(assessment))
+
+    async def save_assessments(self, assessments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        saved = []
+        for assessment in assessments:
+            stored = self.assessments[assessment["class_id"]]
+            if not any(existing["id"] == assessment["id"] for existing in stored):
+                stored.append(dict(assessment))
+                saved.append(assessment)
+        return saved
+
+    async def list_assessments(self, class_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        return [_pick(assessment, fields) for assessment in self.assessments.get(class_id, [])[:LIST_LIMIT]]
+
+    async def list_student_assessments(self, class_id: str, student_id: str) -> List[Dict[str, Any]]:
+        return [dict(assessment) for assessment in self.assessments.get(class_id, []) if assessment["student_id"] == student_id]
+
+    async def stream_assessments(self, class_id: str, batch_size: int = 1000):
+        assessments = list(self.assessments.get(class_id, []))
+        for start in range(0, len(assessments), batch_size):
+            yield [dict(assessment) for assessment in assessments[start:start + batch_size]]
+
+    async def assessment_history(self, class_id: str) -> Dict[str, List[Any]]:
+        assessments = sorted(self.assessments.get(class_id, []), key=lambda assessment: assessment["date"])
+        return {name: [assessment[name] for assessment in assessments] for name in ("student_id", "date", "score")}
+
+    def _counts(self, class_id: str) -> Dict[str, Dict[str, Any]]:
+        stats: Dict[str, Dict[str, Any]] = {}
+        for assessment in self.assessments.get(class_id, []):
+            stat = stats.get(assessment["student_id"])
+            if stat is None:
+                stat = stats[assessment["student_id"]] = {
+                    "_id": assessment["student_id"], "correct": 0, "wrong": 0, "total": 0,
+                }
+            if assessment["score"] == 1:
+                stat["correct"] += 1
+            elif assessment["score"] == 0:
+                stat["wrong"] += 1
+            stat["total"] += 1
+            stat["student_name"] = assessment.get("student_name")
+            stat["student_number"] = assessment.get("student_number")
+        return stats
+
+    async def least_assessed_students(self, class_id: str) -> List[Dict[str, Any]]:
+        students = self.students.get(class_id, {})
+        if not students:
+            return []
+        stats = self._counts(class_id)
+        totals = {student_id: stats[student_id]["total"] if student_id in stats else 0 for student_id in students}
+        fewest = min(totals.values())
+        return [dict(students[student_id]) for student_id, total in totals.items() if total == fewest]
+
+    async def class_counts(self, teacher_id: str) -> Dict[str, Dict[str, Any]]:
+        counts = {}
+        for class_id, class_item in self.classes.items():
+            if class_item["teacher_id"] != teacher_id:
+                continue
+            students = self.students.get(class_id, {})
+            assessments = self.assessments.get(class_id, [])
+            if not students and not assessments:
+                continue
+            counts[class_id] = {
+                "total_students": len(students),
+                "total_assessments": len(assessments),
+                "correct_answers": sum(1 for assessment in assessments if assessment["score"] == 1),
+                "wrong_answers": sum(1 for assessment in assessments if assessment["score"] == 0),
+                "last_activity": max((assessment["date"] for assessment in assessments), default=None),
+            }
+        return counts
+
+    async def student_stats(self, class_id: str, limit: Optional[int] = LIST_LIMIT) -> List[Dict[str, Any]]:
+        return list(self._counts(class_id).values())[:limit]
+
+    async def assessment_totals(self, class_id: str) -> Dict[str, int]:
+        stats = self._counts(class_id).values()
+        return {
+            "assessed_students": len(stats),
+            "correct": sum(stat["correct"] for stat in stats),
+            "wrong": sum(stat["wrong"] for stat in stats),
+        }
+
+    # Import jobs
+
+    async def create_import_job(self, job: Dict[str, Any]):
+        self.import_jobs[job["id"]] = dict(job)
+
+    async def update_import_job(self, job_id: str, fields: Dict[str, Any]):
+        if job_id in self.import_jobs:
+            self.import_jobs[job_id].update(fields)
+
+    async def get_import_job(self, job_id: str, teacher_id: str) -> Optional[Dict[str, Any]]:
+        job = self.import_jobs.get(job_id)
+        if job is None or job["teacher_id"] != teacher_id:
+            return None
+        return dict(job)
+
+    # Change log
+
+    async def allocate_seq(self, count: int) -> int:
+        self.seq += count
+        return self.seq
+
+    async def current_seq(self) -> int:
+        return self.seq
+
+    async def set_change_lease(self, owner: str, low: int, expires_at: datetime):
+        self.change_leases[owner] = (low, expires_at)
+
+    async def drop_change_lease(self, owner: str):
+        self.change_leases.pop(owner, None)
+
+    async def change_bounds(self, now: datetime) -> Tuple[int, int]:
+        lows = [low for low, expires_at in self.change_leases.values() if expires_at > now]
+        return self.changes_floor, min(self.seq, min(lows) - 1) if lows else self.seq
+
+    async def trim_changes(self, before: datetime):
+        for class_id, entries in list(self.changes.items()):
+            self.changes[class_id] = [entry for entry in entries if entry["seq"] > self.changes_floor]
+        expired = [entry["seq"] for entries in self.changes.values() for entry in entries if entry["at"] < before]
+        self.changes_floor = max([self.changes_floor, *expired])
+
+    async def append_changes(self, changes: List[Dict[str, Any]]):
+        for change in changes:
+            entries = self.changes[change["class_id"]]
+            if entries and entries[-1]["seq"] > change["seq"]:
+                # Written out of allocation order by concurrent requests
+                index = bisect.bisect([entry["seq"] for entry in entries], change["seq"])
+                entries.insert(index, dict(change))
+            else:
+                entries.append(dict(change))
+
+    async def list_changes(self, class_id: str, since: int, limit: int) -> List[Dict[str, Any]]:
+        entries = self.changes.get(class_id, [])
+        start = bisect.bisect([entry["seq"] for entry in entries], since)
+        return [
+            {**entry, "doc": dict(entry["doc"]) if entry["doc"] else None}
+            for entry in entries[start:start + limit]
+        ]
+
+    async def delete_changes(self, class_id: str, before_seq: Optional[int] = None):
+        if before_seq is None:
+            self.changes.pop(class_id, None)
+        elif class_id in self.changes:
+            self.changes[class_id] = [entry for entry in self.changes[class_id] if entry["seq"] >= before_seq]
@@ -0,0 +1,436 @@
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.collation import Collation
+
+from .base import LIST_LIMIT, PartialWrite, Repository, copy_ids
+
+# Case-insensitive comparison for roster search and ordering. A query only
+# uses the student indexes when it asks for the same collation
+ROSTER_COLLATION = Collation(locale="en", strength=2)
+
+
+def _projection(fields: Optional[Sequence[str]]) -> Dict[str, int]:
+    if fields is None:
+        return {"_id": 0}
+    return {"_id": 0, **{field: 1 for field in fields}}
+
+
+async def _batches(cursor, batch_size: int):
+    batch = []
+    async for doc in cursor.batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class MongoRepository(Repository):
+    """Repository over a Motor database, the original storage of the app."""
+
+    name = "mongo"
+
+    def __init__(self, db):
+        self.db = db
+
+    async def initialize(self):
+        await self.db.changes.create_index([("class_id", ASCENDING), ("seq", ASCENDING)])
+        # Retention: find the newest expired entry, then trim up to its seq
+        await self.db.changes.create_index("at")
+        await self.db.changes.create_index("seq")
+        await self.db.assessments.create_index("id", unique=True)
+        await self.db.assessments.create_index([("class_id", ASCENDING), ("student_id", ASCENDING)])
+        # The same keys under the roster collation, for the per-student
+        # counts of the participation sort, which runs with that collation
+        await self.db.assessments.create_index(
+            [("class_id", ASCENDING), ("student_id", ASCENDING)],
+            collation=ROSTER_COLLATION, name="class_id_1_student_id_1_roster",
+        )
+        # Cover the per-teacher grouping of the class overview
+        await self.db.students.create_index([("teacher_id", ASCENDING), ("class_id", ASCENDING)])
+        # Roster pages in insertion order
+        await self.db.students.create_index([("class_id", ASCENDING), ("_id", ASCENDING)])
+        # Plain class lookups; the collated indexes below only serve queries
+        # that ask for the roster collation
+        await self.db.students.create_index([("class_id", ASCENDING), ("id", ASCENDING)])
+        await self.db.assessments.create_index(
+            [("teacher_id", ASCENDING), ("class_id", ASCENDING), ("date", ASCENDING), ("score", ASCENDING)]
+        )
+        await self.db.students.create_index(
+            [("class_id", ASCENDING), ("name", ASCENDING), ("student_number", ASCENDING)],
+            collation=ROSTER_COLLATION,
+        )
+        await self.db.students.create_index(
+            [("class_id", ASCENDING), ("student_number", ASCENDING), ("name", ASCENDING)],
+            collation=ROSTER_COLLATION,
+        )
+
+    async def close(self):
+        self.db.client.close()
+
+    async def ping(self):
+        await self.db.command("ping")
+
+    # Teachers
+
+    async def get_teacher_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return await self.db.teachers.find_one({"email": email}, {"_id": 0})
+
+    async def create_teacher(self, teacher: Dict[str, Any]):
+        # insert_one adds _id to the document it is given
+        await self.db.teachers.insert_one(dict(teacher))
+
+    # Classes
+
+    async def create_class(self, class_item: Dict[str, Any]):
+        await self.db.classes.insert_one(dict(class_item))
+
+    async def list_classes(self, teacher_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        return await self.db.classes.find({"teacher_id": teacher_id}, _projection(fields)).to_list(LIST_LIMIT)
+
+    async def get_class(self, class_id: str, teacher_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.classes.find_one({"id": class_id, "teacher_id": teacher_id}, {"_id": 0})
+
+    async def delete_class(self, class_id: str, teacher_id: str) -> bool:
+        result = await self.db.classes.delete_one({"id": class_id, "teacher_id": teacher_id})
+        if result.deleted_count == 0:
+            return False
+        await self.db.students.delete_many({"class_id": class_id})
+        await self.db.assessments.delete_many({"class_id": class_id})
+        return True
+
+    # Students
+
+    async def insert_students(self, students: List[Dict[str, Any]]):
+        if students:
+            await self.db.students.insert_many([dict(student) for student in students], ordered=False)
+
+    async def list_students(self, class_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        return await self.db.students.find({"class_id": class_id}, _projection(fields)).to_list(LIST_LIMIT)
+
+    async def get_student(self, class_id: str, student_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.students.find_one({"id": student_id, "class_id": class_id}, {"_id": 0})
+
+    async def copy_students(self, source_class_id: str, target_class_id: str,
+                            student_ids: Optional[List[str]] = None,
+                            include_history: bool = False) -> List[Dict[str, Any]]:
+        match = {"class_id": source_class_id}
+        if student_ids is not None:
+            match["id"] = {"$in": student_ids}
+        # Only the ids leave the server, read from the (class_id, id) index
+        ids = copy_ids(await self.db.students.distinct("id", match))
+        if not ids:
+            return []
+        source_ids, new_ids = list(ids), list(ids.values())
+
+        # Documents are copied inside the server; $merge may write to the
+        # collection being read since MongoDB 4.4
+        await self.db.students.aggregate([
+            {"$match": {"class_id": source_class_id, "id": {"$in": source_ids}}},
+            {"$project": {"_id": 0}},
+            {"$set": {
+                "id": {"$arrayElemAt": [new_ids, {"$indexOfArray": [source_ids, "$id"]}]},
+                "class_id": target_class_id,
+                "created_at": datetime.utcnow(),
+            }},
+            {"$merge": {"into": "students", "whenMatched": "fail", "whenNotMatched": "insert"}},
+        ]).to_list(None)
+        if include_history:
+            # A pipeline cannot generate ids, so assessments pass through here
+            cursor = self.db.assessments.find({"class_id": source_class_id, "student_id": {"$in": source_ids}}, {"_id": 0})
+            async for batch in _batches(cursor, 1000):
+                await self.db.assessments.insert_many([
+                    {**assessment, "id": str(uuid.uuid4()), "student_id": ids[assessment["student_id"]],
+                     "class_id": target_class_id}
+                    for assessment in batch
+                ], ordered=False)
+        return await self.db.students.find(
+            {"class_id": target_class_id, "id": {"$in": new_ids}}, {"_id": 0}
+        ).to_list(None)
+
+    async def move_students(self, source_class_id: str, target_class_id: str,
+                            student_ids: List[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        students = await self.db.students.find(
+            {"class_id": source_class_id, "id": {"$in": student_ids}}, {"_id": 0}
+        ).to_list(None)
+        moved = [student["id"] for student in students]
+        if not moved:
+            return [], []
+        await self.db.students.update_many(
+            {"class_id": source_class_id, "id": {"$in": moved}}, {"$set": {"class_id": target_class_id}}
+        )
+        await self.db.assessments.update_many(
+            {"class_id": source_class_id, "student_id": {"$in": moved}}, {"$set": {"class_id": target_class_id}}
+        )
+        assessments = await self.db.assessments.find(
+            {"class_id": target_class_id, "student_id": {"$in": moved}}, {"_id": 0}
+        ).to_list(None)
+        for student in students:
+            student["class_id"] = target_class_id
+        return students, assessments
+
+    async def search_students(self, class_ids: List[str], prefix: Optional[str] = None, sort: Optional[str] = "name",
+                              descending: bool = False, unassessed: bool = False,
+                              offset: int = 0, limit: int = LIST_LIMIT,
+                              fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        query: Dict[str, Any] = {"class_id": {"$in": class_ids}}
+        if prefix:
+            # A range rather than a regex, so the match follows the collation
+            # and is answered from the indexes; U+FFFF sorts after any text
+            query["$or"] = [
+                {field: {"$gte": prefix, "$lt": prefix + "\uffff"}} for field in ("name", "student_number")
+            ]
+        if unassessed:
+            # Answered from the (class_id, student_id) assessment index
+            assessed = await self.db.assessments.distinct("student_id", {"class_id": {"$in": class_ids}})
+            query["id"] = {"$nin": assessed}
+
+        if sort == "participation":
+            # Each student's assessments are counted from the index by the
+            # lookup, so the database orders and pages the roster
+            pipeline = [
+                {"$match": query},
+                {"$lookup": {
+                    "from": "assessments",
+                    "let": {"class_id": "$class_id", "student_id": "$id"},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$and": [
+                            {"$eq": ["$class_id", "$$class_id"]},
+                            {"$eq": ["$student_id", "$$student_id"]},
+                        ]}}},
+                        {"$count": "total"},
+                    ],
+                    "as": "participation",
+                }},
+                {"$set": {"participation": {"$sum": "$participation.total"}}},
+                {"$sort": {
+                    "participation": DESCENDING if descending else ASCENDING,
+                    "name": ASCENDING, "student_number": ASCENDING, "_id": ASCENDING,
+                }},
+                {"$skip": offset},
+                {"$limit": limit},
+                {"$project": _projection(fields) if fields is not None else {"_id": 0, "participation": 0}},
+            ]
+            return await self.db.students.aggregate(pipeline, collation=ROSTER_COLLATION).to_list(limit)
+
+        cursor = self.db.students.find(query, _projection(fields), collation=ROSTER_COLLATION)
+        if sort is None:
+            # ObjectIds grow with insertion time
+            return await cursor.sort("_id", ASCENDING).skip(offset).limit(limit).to_list(limit)
+        direction = DESCENDING if descending else ASCENDING
+        secondary = "name" if sort == "student_number" else "student_number"
+        cursor = cursor.sort([(sort, direction), (secondary, direction)]).skip(offset).limit(limit)
+        return await cursor.to_list(limit)
+
+    async def stream_students(self, class_id: str, batch_size: int = 1000):
+        async for batch in _batches(self.db.students.find({"class_id": class_id}, {"_id": 0}), batch_size):
+            yield batch
+
+    async def count_students(self, class_id: str) -> int:
+        return await self.db.students.count_documents({"class_id": class_id})
+
+    async def update_student(self, class_id: str, student_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        updated = await self.db.students.find_one_and_update(
+            {"id": student_id, "class_id": class_id},
+            {"$set": fields},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated:
+            await self.db.assessments.update_many(
+                {"class_id": class_id, "student_id": student_id},
+                {"$set": {"student_name": updated.get("name"), "student_number": updated.get("student_number")}}
+            )
+        return updated
+
+    async def delete_students(self, class_id: str) -> int:
+        result = await self.db.students.delete_many({"class_id": class_id})
+        await self.db.assessments.delete_many({"class_id": class_id})
+        return result.deleted_count
+
+    # Assessments
+
+    async def insert_assessments(self, assessments: List[Dict[str, Any]]):
+        if not assessments:
+            return
+        try:
+            await self.db.assessments.insert_many([dict(assessment) for assessment in assessments], ordered=False)
+        except BulkWriteError as e:
+            # Unordered: every document without a write error is stored
+            failed = {error["index"]: error.get("errmsg", "") for error in e.details.get("writeErrors", [])}
+            if not failed or e.details.get("writeConcernErrors"):
+                raise
+            raise PartialWrite(failed) from e
+
+    async def save_assessments(self, assessments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not assessments:
+            return []
+        result = await self.db.assessments.bulk_write([
+            UpdateOne({"id": assessment["id"]}, {"$setOnInsert": assessment}, upsert=True)
+            for assessment in assessments
+        ], ordered=False)
+        return [assessments[index] for index in sorted(result.upserted_ids)]
+
+    async def list_assessments(self, class_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        return await self.db.assessments.find({"class_id": class_id}, _projection(fields)).to_list(LIST_LIMIT)
+
+    async def list_student_assessments(self, class_id: str, student_id: str) -> List[Dict[str, Any]]:
+        return await self.db.assessments.find({"class_id": class_id, "student_id": student_id}, {"_id": 0}).to_list(None)
+
+    async def stream_assessments(self, class_id: str, batch_size: int = 1000):
+        async for batch in _batches(self.db.assessments.find({"class_id": class_id}, {"_id": 0}), batch_size):
+            yield batch
+
+    async def assessment_history(self, class_id: str) -> Dict[str, List[Any]]:
+        columns = {"student_id": [], "date": [], "score": []}
+        cursor = self.db.assessments.find(
+            {"class_id": class_id}, {"_id": 0, "student_id": 1, "date": 1, "score": 1}
+        ).sort("date", ASCENDING).batch_size(10000)
+        async for assessment in cursor:
+            for name, values in columns.items():
+                values.append(assessment.get(name))
+        return columns
+
+    async def least_assessed_students(self, class_id: str) -> List[Dict[str, Any]]:
+        students = await self.db.students.find({"class_id": class_id}, {"_id": 0}).to_list(None)
+        if not students:
+            return []
+        rows = await self.db.assessments.aggregate([
+            {"$match": {"class_id": class_id}},
+            {"$group": {"_id": "$student_id", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        counts = {row["_id"]: row["count"] for row in rows}
+        fewest = min(counts.get(student["id"], 0) for student in students)
+        return [student for student in students if counts.get(student["id"], 0) == fewest]
+
+    async def class_counts(self, teacher_id: str) -> Dict[str, Dict[str, Any]]:
+        # Students and assessments are grouped per class separately, then
+        # the two sets of groups are combined in the same pipeline
+        pipeline = [
+            {"$match": {"teacher_id": teacher_id}},
+            {"$group": {"_id": "$class_id", "total_students": {"$sum": 1}}},
+            {"$unionWith": {"coll": "assessments", "pipeline": [
+                {"$match": {"teacher_id": teacher_id}},
+                {"$group": {
+                    "_id": "$class_id",
+                    "total_assessments": {"$sum": 1},
+                    "correct_answers": {"$sum": {"$cond": [{"$eq": ["$score", 1]}, 1, 0]}},
+                    "wrong_answers": {"$sum": {"$cond": [{"$eq": ["$score", 0]}, 1, 0]}},
+                    "last_activity": {"$max": "$date"}
+                }}
+            ]}},
+            {"$group": {
+                "_id": "$_id",
+                "total_students": {"$sum": "$total_students"},
+                "total_assessments": {"$sum": "$total_assessments"},
+                "correct_answers": {"$sum": "$correct_answers"},
+                "wrong_answers": {"$sum": "$wrong_answers"},
+                "last_activity": {"$max": "$last_activity"}
+            }}
+        ]
+        rows = await self.db.students.aggregate(pipeline).to_list(None)
+        return {row.pop("_id"): row for row in rows}
+
+    async def student_stats(self, class_id: str, limit: Optional[int] = LIST_LIMIT) -> List[Dict[str, Any]]:
+        pipeline = [
+            {"$match": {"class_id": class_id}},
+            {"$group": {
+                "_id": "$student_id",
+                "correct": {"$sum": {"$cond": [{"$eq": ["$score", 1]}, 1, 0]}},
+                "wrong": {"$sum": {"$cond": [{"$eq": ["$score", 0]}, 1, 0]}},
+                "total": {"$sum": 1},
+                "student_name": {"$last": "$student_name"},
+                "student_number": {"$last": "$student_number"}
+            }}
+        ]
+        return await self.db.assessments.aggregate(pipeline).to_list(limit)
+
+    async def assessment_totals(self, class_id: str) -> Dict[str, int]:
+        pipeline = [
+            {"$match": {"class_id": class_id}},
+            {"$group": {
+                "_id": "$student_id",
+                "correct": {"$sum": {"$cond": [{"$eq": ["$score", 1]}, 1, 0]}},
+                "wrong": {"$sum": {"$cond": [{"$eq": ["$score", 0]}, 1, 0]}}
+            }},
+            {"$group": {
+                "_id": None,
+                "assessed_students": {"$sum": 1},
+                "correct": {"$sum": "$correct"},
+                "wrong": {"$sum": "$wrong"}
+            }}
+        ]
+        rows = await self.db.assessments.aggregate(pipeline).to_list(1)
+        if not rows:
+            return {"assessed_students": 0, "correct": 0, "wrong": 0}
+        return {key: rows[0][key] for key in ("assessed_students", "correct", "wrong")}
+
+    # Import jobs
+
+    async def create_import_job(self, job: Dict[str, Any]):
+        await self.db.import_jobs.insert_one(dict(job))
+
+    async def update_import_job(self, job_id: str, fields: Dict[str, Any]):
+        await self.db.import_jobs.update_one({"id": job_id}, {"$set": fields})
+
+    async def get_import_job(self, job_id: str, teacher_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.import_jobs.find_one({"id": job_id, "teacher_id": teacher_id}, {"_id": 0})
+
+    # Change log
+
+    async def allocate_seq(self, count: int) -> int:
+        counter = await self.db.counters.find_one_and_update(
+            {"_id": "changes"},
+            {"$inc": {"seq": count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return counter["seq"]
+
+    async def current_seq(self) -> int:
+        counter = await self.db.counters.find_one({"_id": "changes"})
+        return counter["seq"] if counter else 0
+
+    async def set_change_lease(self, owner: str, low: int, expires_at: datetime):
+        await self.db.change_leases.update_one(
+            {"_id": owner}, {"$set": {"low": low, "expires_at": expires_at}}, upsert=True
+        )
+
+    async def drop_change_lease(self, owner: str):
+        await self.db.change_leases.delete_one({"_id": owner})
+
+    async def change_bounds(self, now: datetime) -> Tuple[int, int]:
+        counters = await self.db.counters.find({"_id": {"$in": ["changes", "changes_floor"]}}).to_list(None)
+        values = {counter["_id"]: counter["seq"] for counter in counters}
+        seq = values.get("changes", 0)
+        lease = await self.db.change_leases.find_one({"expires_at": {"$gt": now}}, sort=[("low", ASCENDING)])
+        return values.get("changes_floor", 0), min(seq, lease["low"] - 1) if lease else seq
+
+    async def trim_changes(self, before: datetime):
+        floor = await self.db.counters.find_one({"_id": "changes_floor"})
+        if floor:
+            await self.db.changes.delete_many({"seq": {"$lte": floor["seq"]}})
+        newest = await self.db.changes.find_one({"at": {"$lt": before}}, {"seq": 1}, sort=[("at", DESCENDING), ("seq", DESCENDING)])
+        if newest:
+            await self.db.counters.update_one({"_id": "changes_floor"}, {"$max": {"seq": newest["seq"]}}, upsert=True)
+
+    async def append_changes(self, changes: List[Dict[str, Any]]):
+        if changes:
+            await self.db.changes.insert_many([dict(change) for change in changes], ordered=False)
+
+    async def list_changes(self, class_id: str, since: int, limit: int) -> List[Dict[str, Any]]:
+        return await self.db.changes.find(
+            {"class_id": class_id, "seq": {"$gt": since}},
+            {"_id": 0},
+        ).sort("seq", ASCENDING).to_list(limit)
+
+    async def delete_changes(self, class_id: str, before_seq: Optional[int] = None):
+        query = {"class_id": class_id}
+        if before_seq is not None:
+            query["seq"] = {"$lt": before_seq}
+        await self.db.changes.delete_many(query)
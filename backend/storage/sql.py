@@ -0,0 +1,598 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import (
+    BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, Text,
+    and_, case, create_engine, delete, func, insert, literal, or_, select, update,
+)
+from sqlalchemy.exc import IntegrityError
+
+from .base import LIST_LIMIT, Repository, copy_ids
+
+metadata = MetaData()
+
+teachers = Table(
+    "teachers", metadata,
+    Column("id", String(36), primary_key=True),
+    Column("name", Text, nullable=False),
+    Column("email", String(320), nullable=False, unique=True),
+    Column("password", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+
+classes = Table(
+    "classes", metadata,
+    Column("id", String(36), primary_key=True),
+    Column("name", Text, nullable=False),
+    Column("teacher_id", String(36), nullable=False, index=True),
+    Column("created_at", DateTime, nullable=False),
+)
+
+students = Table(
+    "students", metadata,
+    Column("id", String(36), primary_key=True),
+    Column("class_id", String(36), nullable=False, index=True),
+    Column("teacher_id", String(36), nullable=False),
+    Column("name", Text),
+    Column("student_number", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+
+# Case-insensitive roster search and ordering compare lower-cased text
+Index("ix_students_class_name", students.c.class_id, func.lower(students.c.name), func.lower(students.c.student_number))
+Index("ix_students_class_number", students.c.class_id, func.lower(students.c.student_number), func.lower(students.c.name))
+Index("ix_students_teacher_class", students.c.teacher_id, students.c.class_id)
+
+assessments = Table(
+    "assessments", metadata,
+    Column("id", String(36), primary_key=True),
+    Column("class_id", String(36), nullable=False),
+    Column("student_id", String(36), nullable=False),
+    Column("teacher_id", String(36), nullable=False),
+    Column("score", Integer, nullable=False),
+    Column("date", DateTime, nullable=False),
+    Column("student_name", Text),
+    Column("student_number", Text),
+    Index("ix_assessments_class_student", "class_id", "student_id"),
+    Index("ix_assessments_teacher_class", "teacher_id", "class_id", "date", "score"),
+)
+
+import_jobs = Table(
+    "import_jobs", metadata,
+    Column("id", String(36), primary_key=True),
+    Column("class_id", String(36), nullable=False),
+    Column("teacher_id", String(36), nullable=False),
+    Column("status", String(16), nullable=False),
+    Column("students_added", Integer, nullable=False, default=0),
+    Column("error", Text),
+    Column("created_at", DateTime, nullable=False),
+    Column("finished_at", DateTime),
+)
+
+changes = Table(
+    "changes", metadata,
+    Column("seq", BigInteger, primary_key=True, autoincrement=False),
+    Column("class_id", String(36), nullable=False),
+    Column("entity", String(16), nullable=False),
+    Column("op", String(16), nullable=False),
+    Column("entity_id", String(36), nullable=False),
+    Column("doc", Text),
+    Column("at", DateTime, nullable=False),
+    Index("ix_changes_class_seq", "class_id", "seq"),
+    Index("ix_changes_at", "at"),
+)
+
+counters = Table(
+    "counters", metadata,
+    Column("name", String(32), primary_key=True),
+    Column("seq", BigInteger, nullable=False),
+)
+
+change_leases = Table(
+    "change_leases", metadata,
+    Column("owner", String(64), primary_key=True),
+    Column("low", BigInteger, nullable=False),
+    Column("expires_at", DateTime, nullable=False),
+)
+
+
+def _columns(table: Table, fields: Optional[Sequence[str]]) -> list:
+    if fields is None:
+        return [table]
+    return [table.c[field] for field in fields]
+
+
+def _row(table: Table, doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {column.name: doc[column.name] for column in table.columns if column.name in doc}
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj):
+    if set(obj) == {"$date"}:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+def _dump_doc(doc: Optional[Dict[str, Any]]) -> Optional[str]:
+    return None if doc is None else json.dumps(doc, default=_encode)
+
+
+def _load_doc(doc: Optional[str]) -> Optional[Dict[str, Any]]:
+    return None if doc is None else json.loads(doc, object_hook=_decode)
+
+
+class SQLRepository(Repository):
+    """Repository over a relational database through SQLAlchemy Core.
+
+    Statistics and fair picks are single set-based queries. The driver
+    (psycopg2 for PostgreSQL) is blocking, so every call runs in a worker
+    thread with its own transaction.
+    """
+
+    name = "sql"
+
+    def __init__(self, url: str, **engine_options):
+        self.engine = create_engine(url, pool_pre_ping=True, **engine_options)
+
+    async def _run(self, fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    def _fetch_one(self, query) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            row = conn.execute(query).mappings().first()
+        return dict(row) if row else None
+
+    def _fetch_all(self, query) -> List[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            return [dict(row) for row in conn.execute(query).mappings()]
+
+    def _execute(self, *statements):
+        with self.engine.begin() as conn:
+            for statement in statements:
+                conn.execute(statement)
+
+    def _insert_many(self, table: Table, docs: List[Dict[str, Any]]):
+        if docs:
+            with self.engine.begin() as conn:
+                conn.execute(insert(table), [_row(table, doc) for doc in docs])
+
+    def _initialize(self):
+        metadata.create_all(self.engine)
+        for name in ("changes", "changes_floor"):
+            try:
+                self._execute(insert(counters).values(name=name, seq=0))
+            except IntegrityError:
+                pass
+
+    async def initialize(self):
+        await self._run(self._initialize)
+
+    async def close(self):
+        await self._run(self.engine.dispose)
+
+    async def ping(self):
+        await self._run(self._fetch_one, select(literal(1)))
+
+    # Teachers
+
+    async def get_teacher_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._fetch_one, select(teachers).where(teachers.c.email == email))
+
+    async def create_teacher(self, teacher: Dict[str, Any]):
+        await self._run(self._insert_many, teachers, [teacher])
+
+    # Classes
+
+    async def create_class(self, class_item: Dict[str, Any]):
+        await self._run(self._insert_many, classes, [class_item])
+
+    async def list_classes(self, teacher_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        query = select(*_columns(classes, fields)).where(classes.c.teacher_id == teacher_id).order_by(classes.c.created_at).limit(LIST_LIMIT)
+        return await self._run(self._fetch_all, query)
+
+    async def get_class(self, class_id: str, teacher_id: str) -> Optional[Dict[str, Any]]:
+        query = select(classes).where(classes.c.id == class_id, classes.c.teacher_id == teacher_id)
+        return await self._run(self._fetch_one, query)
+
+    def _delete_class(self, class_id: str, teacher_id: str) -> bool:
+        with self.engine.begin() as conn:
+            result = conn.execute(delete(classes).where(classes.c.id == class_id, classes.c.teacher_id == teacher_id))
+            if result.rowcount == 0:
+                return False
+            conn.execute(delete(students).where(students.c.class_id == class_id))
+            conn.execute(delete(assessments).where(assessments.c.class_id == class_id))
+        return True
+
+    async def delete_class(self, class_id: str, teacher_id: str) -> bool:
+        return await self._run(self._delete_class, class_id, teacher_id)
+
+    # Students
+
+    async def insert_students(self, docs: List[Dict[str, Any]]):
+        await self._run(self._insert_many, students, docs)
+
+    async def list_students(self, class_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        query = select(*_columns(students, fields)).where(students.c.class_id == class_id).order_by(students.c.created_at).limit(LIST_LIMIT)
+        return await self._run(self._fetch_all, query)
+
+    async def get_student(self, class_id: str, student_id: str) -> Optional[Dict[str, Any]]:
+        query = select(students).where(students.c.id == student_id, students.c.class_id == class_id)
+        return await self._run(self._fetch_one, query)
+
+    def _copy_students(self, source_class_id: str, target_class_id: str, student_ids: Optional[List[str]],
+                       include_history: bool) -> List[Dict[str, Any]]:
+        query = select(students).where(students.c.class_id == source_class_id)
+        if student_ids is not None:
+            query = query.where(students.c.id.in_(student_ids))
+        # One transaction, so the copy lands whole or not at all
+        with self.engine.begin() as conn:
+            sources = [dict(row) for row in conn.execute(query).mappings()]
+            ids = copy_ids(source["id"] for source in sources)
+            now = datetime.utcnow()
+            copies = [
+                {**source, "id": ids[source["id"]], "class_id": target_class_id, "created_at": now}
+                for source in sources
+            ]
+            if copies:
+                conn.execute(insert(students), copies)
+            if include_history and ids:
+                history = conn.execution_options(stream_results=True, yield_per=1000).execute(
+                    select(assessments).where(
+                        assessments.c.class_id == source_class_id, assessments.c.student_id.in_(list(ids))
+                    )
+                )
+                for partition in history.mappings().partitions(1000):
+                    conn.execute(insert(assessments), [
+                        {**row, "id": str(uuid.uuid4()), "student_id": ids[row["student_id"]],
+                         "class_id": target_class_id}
+                        for row in partition
+                    ])
+            return copies
+
+    async def copy_students(self, source_class_id: str, target_class_id: str,
+                            student_ids: Optional[List[str]] = None,
+                            include_history: bool = False) -> List[Dict[str, Any]]:
+        return await self._run(self._copy_students, source_class_id, target_class_id, student_ids, include_history)
+
+    def _move_students(self, source_class_id: str, target_class_id: str,
+                       student_ids: List[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        with self.engine.begin() as conn:
+            moved = list(conn.execute(select(students.c.id).where(
+                students.c.class_id == source_class_id, students.c.id.in_(student_ids)
+            )).scalars())
+            if not moved:
+                return [], []
+            conn.execute(update(students).where(students.c.id.in_(moved)).values(class_id=target_class_id))
+            conn.execute(update(assessments).where(
+                assessments.c.class_id == source_class_id, assessments.c.student_id.in_(moved)
+            ).values(class_id=target_class_id))
+            moved_students = conn.execute(select(students).where(students.c.id.in_(moved))).mappings()
+            moved_students = [dict(row) for row in moved_students]
+            moved_assessments = conn.execute(select(assessments).where(
+                assessments.c.class_id == target_class_id, assessments.c.student_id.in_(moved)
+            ).order_by(assessments.c.date)).mappings()
+            return moved_students, [dict(row) for row in moved_assessments]
+
+    async def move_students(self, source_class_id: str, target_class_id: str,
+                            student_ids: List[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        return await self._run(self._move_students, source_class_id, target_class_id, student_ids)
+
+    async def search_students(self, class_ids: List[str], prefix: Optional[str] = None, sort: Optional[str] = "name",
+                              descending: bool = False, unassessed: bool = False,
+                              offset: int = 0, limit: int = LIST_LIMIT,
+                              fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        name = func.lower(students.c.name)
+        number = func.lower(students.c.student_number)
+        query = select(*_columns(students, fields)).where(students.c.class_id.in_(class_ids))
+        if prefix:
+            # A range rather than LIKE, so the lower() indexes answer it
+            low = prefix.lower()
+            query = query.where(or_(
+                and_(name >= low, name < low + "\uffff"),
+                and_(number >= low, number < low + "\uffff"),
+            ))
+        if unassessed or sort == "participation":
+            counts = (
+                select(assessments.c.student_id, func.count().label("total"))
+                .where(assessments.c.class_id.in_(class_ids))
+                .group_by(assessments.c.student_id)
+                .subquery()
+            )
+            query = query.outerjoin(counts, counts.c.student_id == students.c.id)
+            if unassessed:
+                query = query.where(counts.c.student_id.is_(None))
+
+        if sort == "participation":
+            total = func.coalesce(counts.c.total, 0)
+            order = [total.desc() if descending else total.asc(), name, number]
+        elif sort is None:
+            order = [students.c.created_at]
+        else:
+            order = [number, name] if sort == "student_number" else [name, number]
+            if descending:
+                order = [column.desc() for column in order]
+        query = query.order_by(*order, students.c.id).offset(offset).limit(limit)
+        return await self._run(self._fetch_all, query)
+
+    def _iter_batches(self, query, batch_size: int):
+        # A server-side cursor, so only one batch is in memory at a time
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+            for partition in result.mappings().partitions(batch_size):
+                yield [dict(row) for row in partition]
+
+    async def _stream(self, query, batch_size: int):
+        batches = self._iter_batches(query, batch_size)
+        try:
+            while True:
+                batch = await asyncio.to_thread(next, batches, None)
+                if batch is None:
+                    return
+                yield batch
+        finally:
+            await asyncio.to_thread(batches.close)
+
+    async def stream_students(self, class_id: str, batch_size: int = 1000):
+        async for batch in self._stream(select(students).where(students.c.class_id == class_id), batch_size):
+            yield batch
+
+    async def count_students(self, class_id: str) -> int:
+        query = select(func.count().label("count")).select_from(students).where(students.c.class_id == class_id)
+        return (await self._run(self._fetch_one, query))["count"]
+
+    def _update_student(self, class_id: str, student_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(students)
+                .where(students.c.id == student_id, students.c.class_id == class_id)
+                .values(**_row(students, fields))
+            )
+            if result.rowcount == 0:
+                return None
+            updated = dict(conn.execute(select(students).where(students.c.id == student_id)).mappings().one())
+            conn.execute(
+                update(assessments)
+                .where(assessments.c.class_id == class_id, assessments.c.student_id == student_id)
+                .values(student_name=updated["name"], student_number=updated["student_number"])
+            )
+        return updated
+
+    async def update_student(self, class_id: str, student_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._run(self._update_student, class_id, student_id, fields)
+
+    def _delete_students(self, class_id: str) -> int:
+        with self.engine.begin() as conn:
+            result = conn.execute(delete(students).where(students.c.class_id == class_id))
+            conn.execute(delete(assessments).where(assessments.c.class_id == class_id))
+        return result.rowcount
+
+    async def delete_students(self, class_id: str) -> int:
+        return await self._run(self._delete_students, class_id)
+
+    # Assessments
+
+    async def insert_assessments(self, docs: List[Dict[str, Any]]):
+        await self._run(self._insert_many, assessments, docs)
+
+    def _save_assessments(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self.engine.begin() as conn:
+            existing = set(conn.execute(
+                select(assessments.c.id).where(assessments.c.id.in_([doc["id"] for doc in docs]))
+            ).scalars())
+            saved = [doc for doc in docs if doc["id"] not in existing]
+            if saved:
+                conn.execute(insert(assessments), [_row(assessments, doc) for doc in saved])
+        return saved
+
+    async def save_assessments(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not docs:
+            return []
+        return await self._run(self._save_assessments, docs)
+
+    async def list_assessments(self, class_id: str, fields: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        query = select(*_columns(assessments, fields)).where(assessments.c.class_id == class_id).order_by(assessments.c.date).limit(LIST_LIMIT)
+        return await self._run(self._fetch_all, query)
+
+    async def list_student_assessments(self, class_id: str, student_id: str) -> List[Dict[str, Any]]:
+        query = select(assessments).where(assessments.c.class_id == class_id, assessments.c.student_id == student_id)
+        return await self._run(self._fetch_all, query)
+
+    def _assessment_history(self, class_id: str) -> Dict[str, List[Any]]:
+        query = (
+            select(assessments.c.student_id, assessments.c.date, assessments.c.score)
+            .where(assessments.c.class_id == class_id)
+            .order_by(assessments.c.date)
+        )
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).all()
+        student_ids, dates, scores = zip(*rows) if rows else ((), (), ())
+        return {"student_id": list(student_ids), "date": list(dates), "score": list(scores)}
+
+    async def stream_assessments(self, class_id: str, batch_size: int = 1000):
+        async for batch in self._stream(select(assessments).where(assessments.c.class_id == class_id), batch_size):
+            yield batch
+
+    async def assessment_history(self, class_id: str) -> Dict[str, List[Any]]:
+        return await self._run(self._assessment_history, class_id)
+
+    async def least_assessed_students(self, class_id: str) -> List[Dict[str, Any]]:
+        counts = (
+            select(students.c.id.label("student_id"), func.count(assessments.c.id).label("total"))
+            .select_from(students.outerjoin(assessments, and_(
+                assessments.c.student_id == students.c.id,
+                assessments.c.class_id == students.c.class_id,
+            )))
+            .where(students.c.class_id == class_id)
+            .group_by(students.c.id)
+            .cte("counts")
+        )
+        query = (
+            select(students)
+            .join(counts, counts.c.student_id == students.c.id)
+            .where(counts.c.total == select(func.min(counts.c.total)).scalar_subquery())
+        )
+        return await self._run(self._fetch_all, query)
+
+    async def class_counts(self, teacher_id: str) -> Dict[str, Dict[str, Any]]:
+        student_counts = (
+            select(students.c.class_id, func.count().label("total_students"))
+            .where(students.c.teacher_id == teacher_id)
+            .group_by(students.c.class_id)
+            .subquery()
+        )
+        assessment_counts = (
+            select(
+                assessments.c.class_id,
+                func.count().label("total_assessments"),
+                func.sum(case((assessments.c.score == 1, 1), else_=0)).label("correct_answers"),
+                func.sum(case((assessments.c.score == 0, 1), else_=0)).label("wrong_answers"),
+                func.max(assessments.c.date).label("last_activity"),
+            )
+            .where(assessments.c.teacher_id == teacher_id)
+            .group_by(assessments.c.class_id)
+            .subquery()
+        )
+        query = (
+            select(
+                classes.c.id,
+                func.coalesce(student_counts.c.total_students, 0).label("total_students"),
+                func.coalesce(assessment_counts.c.total_assessments, 0).label("total_assessments"),
+                func.coalesce(assessment_counts.c.correct_answers, 0).label("correct_answers"),
+                func.coalesce(assessment_counts.c.wrong_answers, 0).label("wrong_answers"),
+                assessment_counts.c.last_activity,
+            )
+            .select_from(
+                classes
+                .outerjoin(student_counts, student_counts.c.class_id == classes.c.id)
+                .outerjoin(assessment_counts, assessment_counts.c.class_id == classes.c.id)
+            )
+            .where(classes.c.teacher_id == teacher_id)
+            .where((student_counts.c.class_id.isnot(None)) | (assessment_counts.c.class_id.isnot(None)))
+        )
+        rows = await self._run(self._fetch_all, query)
+        return {row.pop("id"): row for row in rows}
+
+    async def student_stats(self, class_id: str, limit: Optional[int] = LIST_LIMIT) -> List[Dict[str, Any]]:
+        query = (
+            select(
+                assessments.c.student_id.label("_id"),
+                func.sum(case((assessments.c.score == 1, 1), else_=0)).label("correct"),
+                func.sum(case((assessments.c.score == 0, 1), else_=0)).label("wrong"),
+                func.count().label("total"),
+                func.max(assessments.c.student_name).label("student_name"),
+                func.max(assessments.c.student_number).label("student_number"),
+            )
+            .where(assessments.c.class_id == class_id)
+            .group_by(assessments.c.student_id)
+            .limit(limit)
+        )
+        rows = await self._run(self._fetch_all, query)
+        for row in rows:
+            for key in ("correct", "wrong", "total"):
+                row[key] = int(row[key])
+        return rows
+
+    async def assessment_totals(self, class_id: str) -> Dict[str, int]:
+        query = (
+            select(
+                func.count(func.distinct(assessments.c.student_id)).label("assessed_students"),
+                func.sum(case((assessments.c.score == 1, 1), else_=0)).label("correct"),
+                func.sum(case((assessments.c.score == 0, 1), else_=0)).label("wrong"),
+            )
+            .where(assessments.c.class_id == class_id)
+        )
+        row = await self._run(self._fetch_one, query)
+        return {key: int(value or 0) for key, value in row.items()}
+
+    # Import jobs
+
+    async def create_import_job(self, job: Dict[str, Any]):
+        await self._run(self._insert_many, import_jobs, [job])
+
+    async def update_import_job(self, job_id: str, fields: Dict[str, Any]):
+        await self._run(self._execute, update(import_jobs).where(import_jobs.c.id == job_id).values(**_row(import_jobs, fields)))
+
+    async def get_import_job(self, job_id: str, teacher_id: str) -> Optional[Dict[str, Any]]:
+        query = select(import_jobs).where(import_jobs.c.id == job_id, import_jobs.c.teacher_id == teacher_id)
+        return await self._run(self._fetch_one, query)
+
+    # Change log
+
+    def _allocate_seq(self, count: int) -> int:
+        # The update locks the counter row until commit, so concurrent
+        # allocations are serialized and never overlap
+        with self.engine.begin() as conn:
+            conn.execute(update(counters).where(counters.c.name == "changes").values(seq=counters.c.seq + count))
+            return conn.execute(select(counters.c.seq).where(counters.c.name == "changes")).scalar_one()
+
+    async def allocate_seq(self, count: int) -> int:
+        return await self._run(self._allocate_seq, count)
+
+    async def current_seq(self) -> int:
+        row = await self._run(self._fetch_one, select(counters.c.seq).where(counters.c.name == "changes"))
+        return row["seq"] if row else 0
+
+    def _set_change_lease(self, owner: str, low: int, expires_at: datetime):
+        # Only the owner writes its row, so update-then-insert cannot race
+        with self.engine.begin() as conn:
+            values = {"low": low, "expires_at": expires_at}
+            if not conn.execute(update(change_leases).where(change_leases.c.owner == owner).values(**values)).rowcount:
+                conn.execute(insert(change_leases).values(owner=owner, **values))
+
+    async def set_change_lease(self, owner: str, low: int, expires_at: datetime):
+        await self._run(self._set_change_lease, owner, low, expires_at)
+
+    async def drop_change_lease(self, owner: str):
+        await self._run(self._execute, delete(change_leases).where(change_leases.c.owner == owner))
+
+    def _change_bounds(self, now: datetime) -> Tuple[int, int]:
+        with self.engine.connect() as conn:
+            values = dict(conn.execute(
+                select(counters.c.name, counters.c.seq).where(counters.c.name.in_(["changes", "changes_floor"]))
+            ).all())
+            low = conn.execute(select(func.min(change_leases.c.low)).where(change_leases.c.expires_at > now)).scalar()
+        seq = values["changes"]
+        return values["changes_floor"], min(seq, low - 1) if low is not None else seq
+
+    async def change_bounds(self, now: datetime) -> Tuple[int, int]:
+        return await self._run(self._change_bounds, now)
+
+    def _trim_changes(self, before: datetime):
+        floor = counters.c.name == "changes_floor"
+        with self.engine.begin() as conn:
+            conn.execute(delete(changes).where(changes.c.seq <= select(counters.c.seq).where(floor).scalar_subquery()))
+            newest = conn.execute(select(func.max(changes.c.seq)).where(changes.c.at < before)).scalar()
+            if newest is not None:
+                conn.execute(update(counters).where(floor, counters.c.seq < newest).values(seq=newest))
+
+    async def trim_changes(self, before: datetime):
+        await self._run(self._trim_changes, before)
+
+    async def append_changes(self, docs: List[Dict[str, Any]]):
+        await self._run(self._insert_many, changes, [{**doc, "doc": _dump_doc(doc["doc"])} for doc in docs])
+
+    async def list_changes(self, class_id: str, since: int, limit: int) -> List[Dict[str, Any]]:
+        query = (
+            select(changes)
+            .where(changes.c.class_id == class_id, changes.c.seq > since)
+            .order_by(changes.c.seq)
+            .limit(limit)
+        )
+        rows = await self._run(self._fetch_all, query)
+        for row in rows:
+            row["doc"] = _load_doc(row["doc"])
+        return rows
+
+    async def delete_changes(self, class_id: str, before_seq: Optional[int] = None):
+        statement = delete(changes).where(changes.c.class_id == class_id)
+        if before_seq is not None:
+            statement = statement.where(changes.c.seq < before_seq)
+        await self._run(self._execute, statement)
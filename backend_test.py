@@ -3,7 +3,9 @@ import sys
 import random
 import string
 import json
+import gzip
 from datetime import datetime
+from websockets.sync.client import connect as websocket_connect
 
 class StudentParticipationAPITester:
     def __init__(self, base_url="https://3874fa8d-63e8-40c5-90ed-3254b9e872c4.preview.emergentagent.com/api"):
@@ -15,6 +17,8 @@ class StudentParticipationAPITester:
         self.tests_passed = 0
         self.class_id = None
         self.student_id = None
+        self.clone_class_id = None
+        self.copied_student_id = None
 
     def run_test(self, name, method, endpoint, expected_status, data=None, files=None):
         """Run a single API test"""
@@ -63,6 +67,24 @@ class StudentParticipationAPITester:
         random_string = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
         return f"test_{random_string}@example.com"
 
+    def test_health(self):
+        """Test the liveness and readiness probes"""
+        success, _ = self.run_test(
+            "Health Check",
+            "GET",
+            "healthz",
+            200
+        )
+        if not success:
+            return False
+        success, response = self.run_test(
+            "Readiness Check",
+            "GET",
+            "readyz",
+            200
+        )
+        return success and response.get('status') == 'ready'
+
     def test_register(self):
         """Test teacher registration"""
         email = self.generate_random_email()
@@ -198,6 +220,23 @@ class StudentParticipationAPITester:
         )
         return success
 
+    def test_upload_students_file(self):
+        """Test uploading a gzip-compressed CSV roster as multipart"""
+        if not self.class_id:
+            print("❌ No class ID available for testing")
+            return False
+        
+        csv_content = "name,student_number\nStudent 4,S004\nStudent 5,S005"
+        
+        success, _ = self.run_test(
+            "Upload Students File",
+            "POST",
+            f"classes/{self.class_id}/students/upload-file",
+            200,
+            files={"file": ("students.csv.gz", gzip.compress(csv_content.encode()), "application/gzip")}
+        )
+        return success
+
     def test_get_students(self):
         """Test getting all students in a class"""
         if not self.class_id:
@@ -212,6 +251,45 @@ class StudentParticipationAPITester:
         )
         return success
 
+    def test_filter_students(self):
+        """Test prefix search and sorting of a class roster"""
+        if not self.class_id:
+            print("❌ No class ID available for testing")
+            return False
+        
+        success, response = self.run_test(
+            "Filter Students",
+            "GET",
+            f"classes/{self.class_id}/students?q=student%20&sort=student_number&order=desc",
+            200
+        )
+        numbers = [student['student_number'] for student in response] if success else []
+        return success and len(numbers) == 5 and numbers == sorted(numbers, reverse=True)
+
+    def test_sparse_students(self):
+        """Test requesting only some fields of a class roster"""
+        if not self.class_id:
+            print("❌ No class ID available for testing")
+            return False
+        
+        success, response = self.run_test(
+            "Sparse Students",
+            "GET",
+            f"classes/{self.class_id}/students?fields=id,name",
+            200
+        )
+        return success and len(response) > 0 and all(set(student) == {'id', 'name'} for student in response)
+
+    def test_search_students(self):
+        """Test searching students across all classes"""
+        success, response = self.run_test(
+            "Search Students",
+            "GET",
+            "students/search?q=S00&unassessed=true",
+            200
+        )
+        return success and all(student['class_id'] == self.class_id for student in response)
+
     def test_get_random_student(self):
         """Test getting a random student for assessment"""
         if not self.class_id:
@@ -261,6 +339,20 @@ class StudentParticipationAPITester:
         )
         return success
 
+    def test_sort_by_participation(self):
+        """Test ordering a class roster by number of assessments"""
+        if not self.class_id or not self.student_id:
+            print("❌ No class ID or student ID available for testing")
+            return False
+        
+        success, response = self.run_test(
+            "Sort Students By Participation",
+            "GET",
+            f"classes/{self.class_id}/students?sort=participation&order=desc&limit=2",
+            200
+        )
+        return success and len(response) == 2 and response[0]['id'] == self.student_id
+
     def test_get_statistics(self):
         """Test getting statistics for a class"""
         if not self.class_id:
@@ -275,6 +367,286 @@ class StudentParticipationAPITester:
         )
         return success
 
+    def test_get_overview(self):
+        """Test getting per-class counts for the teacher's dashboard"""
+        if not self.class_id:
+            print("❌ No class ID available for testing")
+            return False
+        
+        success, response = self.run_test(
+            "Get Overview",
+            "GET",
+            "overview",
+            200
+        )
+        overview = {class_item['id']: class_item for class_item in response} if success else {}
+        return success and overview.get(self.class_id, {}).get('total_assessments') == 2
+
+    def test_batch(self):
+        """Test running several requests in one batch call"""
+        if not self.class_id:
+            print("❌ No class ID available for testing")
+            return False
+        
+        success, response = self.run_test(
+            "Batch Requests",
+            "POST",
+            "batch",
+            200,
+            data={"requests": [
+                {"id": "class", "path": f"/classes/{self.class_id}"},
+                {"id": "statistics", "path": f"/classes/{self.class_id}/statistics"},
+                {"id": "missing", "path": "/classes/does-not-exist"}
+            ]}
+        )
+        statuses = {item['id']: item['status'] for item in response.get('responses', [])} if success else {}
+        return success and statuses == {"class": 200, "statistics": 200, "missing": 404}
+
+    def test_get_changes(self):
+        """Test getting incremental changes for a class"""
+        if not self.class_id:
+            print("❌ No class ID available for testing")
+            return False
+        
+        success, response = self.run_test(
+            "Get Class Changes",
+            "GET",
+            f"classes/{self.class_id}/changes?since=0",
+            200
+        )
+        return success and 'token' in response
+
+    def test_changes_round_trip(self):
+        """Test that each change is in the delta fetched right after it"""
+        success, response = self.run_test(
+            "Create Changes Class",
+            "POST",
+            "classes",
+            200,
+            data={"name": "Changes Test Class"}
+        )
+        if not success:
+            return False
+        class_id = response['id']
+        try:
+            success, changes = self.run_test("Get Changes Token", "GET", f"classes/{class_id}/changes?since=0", 200)
+            if not success:
+                return False
+            token = changes['token']
+
+            success, student = self.run_test(
+                "Add Changes Student",
+                "POST",
+                f"classes/{class_id}/students",
+                200,
+                data={"name": "Delta Student", "student_number": "D1"}
+            )
+            if not success:
+                return False
+            success, changes = self.run_test("Get Student Delta", "GET", f"classes/{class_id}/changes?since={token}", 200)
+            created = [doc['id'] for doc in changes.get('students', {}).get('created', [])] if success else []
+            if created != [student['id']] or changes['reset'] or changes['has_more']:
+                print(f"❌ Failed - Student delta: {changes}")
+                return False
+            token = changes['token']
+
+            success, _ = self.run_test(
+                "Add Changes Assessment",
+                "POST",
+                f"classes/{class_id}/assessments",
+                200,
+                data={"student_id": student['id'], "score": 1}
+            )
+            if not success:
+                return False
+            success, changes = self.run_test("Get Assessment Delta", "GET", f"classes/{class_id}/changes?since={token}", 200)
+            created = changes.get('assessments', {}).get('created', []) if success else []
+            if [doc['student_id'] for doc in created] != [student['id']] or changes['token'] <= token:
+                print(f"❌ Failed - Assessment delta: {changes}")
+                return False
+            token = changes['token']
+
+            success, changes = self.run_test("Get Empty Delta", "GET", f"classes/{class_id}/changes?since={token}", 200)
+            if not success or changes['token'] != token or changes['assessments']['created']:
+                return False
+
+            success, _ = self.run_test("Clear Changes Class", "DELETE", f"classes/{class_id}/students", 200)
+            if not success:
+                return False
+            success, changes = self.run_test("Get Reset Delta", "GET", f"classes/{class_id}/changes?since={token}", 200)
+            return success and changes['reset'] and changes['token'] > token
+        finally:
+            self.run_test("Delete Changes Class", "DELETE", f"classes/{class_id}", 200)
+
+    def test_get_leaderboard(self):
+        """Test getting the top students of a class"""
+        if not self.class_id:
+            print("❌ No class ID available for testing")
+            return False
+        
+        success, response = self.run_test(
+            "Get Class Leaderboard",
+            "GET",
+            f"classes/{self.class_id}/leaderboard?metric=correct_percentage&k=5&order=asc",
+            200
+        )
+        return success and 'students' in response
+
+    def test_get_analytics(self):
+        """Test getting participation analytics for a class"""
+        if not self.class_id:
+            print("❌ No class ID available for testing")
+            return False
+        
+        success, response = self.run_test(
+            "Get Class Analytics",
+            "GET",
+            f"classes/{self.class_id}/analytics?window=7&recent=5",
+            200
+        )
+        return success and 'students' in response and 'daily' in response
+
+    def test_live_session(self):
+        """Test scoring and picking over the live session WebSocket"""
+        if not self.class_id:
+            print("❌ No class ID available for testing")
+            return False
+        
+        self.tests_run += 1
+        print("\n🔍 Testing Live Session...")
+        url = self.base_url.replace("https://", "wss://").replace("http://", "ws://")
+        try:
+            with websocket_connect(f"{url}/classes/{self.class_id}/session?token={self.token}") as ws:
+                ws.send("not json")
+                rejected = json.loads(ws.recv())
+                ws.send(json.dumps({"type": "pick"}))
+                picked = json.loads(ws.recv())
+                ws.send(json.dumps({"type": "score", "score": 1}))
+                scored = json.loads(ws.recv())
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return False
+        
+        success = (
+            rejected.get("type") == "error"
+            and picked.get("type") == "student"
+            and scored.get("type") == "scored"
+            and scored["assessment"]["student_id"] == picked["student"]["id"]
+            and "statistics" in scored
+        )
+        if success:
+            self.tests_passed += 1
+            print("✅ Passed - Rejected a malformed frame, then scored and picked over one connection")
+        else:
+            print(f"❌ Failed - Unexpected frames: {rejected}, {picked}, {scored}")
+        return success
+
+    def test_clone_class(self):
+        """Test cloning a class with its roster and history"""
+        if not self.class_id:
+            print("❌ No class ID available for testing")
+            return False
+        
+        success, response = self.run_test(
+            "Clone Class",
+            "POST",
+            f"classes/{self.class_id}/clone",
+            200,
+            data={"include_history": True}
+        )
+        if not success or response['id'] == self.class_id:
+            return False
+        self.clone_class_id = response['id']
+        
+        # Every assessment is copied and points at the copy of its student
+        _, source_students = self.run_test("Get Source Students", "GET", f"classes/{self.class_id}/students", 200)
+        _, source_assessments = self.run_test("Get Source Assessments", "GET", f"classes/{self.class_id}/assessments", 200)
+        _, students = self.run_test("Get Cloned Students", "GET", f"classes/{self.clone_class_id}/students", 200)
+        success, assessments = self.run_test("Get Cloned Assessments", "GET", f"classes/{self.clone_class_id}/assessments", 200)
+        if not success:
+            return False
+        source_numbers = {student['id']: student['student_number'] for student in source_students}
+        numbers = {student['id']: student['student_number'] for student in students}
+        copied = sorted(numbers.get(assessment['student_id'], "") for assessment in assessments)
+        expected = sorted(source_numbers[assessment['student_id']] for assessment in source_assessments)
+        if not expected or copied != expected or set(numbers) & set(source_numbers):
+            print(f"❌ Failed - Cloned history does not match: {copied} != {expected}")
+            return False
+        return True
+
+    def test_copy_students(self):
+        """Test copying a student into another class"""
+        if not self.class_id or not self.clone_class_id:
+            print("❌ No class IDs available for testing")
+            return False
+        
+        success, response = self.run_test(
+            "Copy Students",
+            "POST",
+            f"classes/{self.class_id}/students/copy",
+            200,
+            data={"target_class_id": self.clone_class_id, "student_ids": [self.student_id, self.student_id]}
+        )
+        if success and len(response) == 1 and response[0]['id'] != self.student_id:
+            self.copied_student_id = response[0]['id']
+            return True
+        return False
+
+    def test_move_students(self):
+        """Test moving a student to another class"""
+        if not self.clone_class_id or not self.copied_student_id:
+            print("❌ No copied student available for testing")
+            return False
+        
+        success, response = self.run_test(
+            "Move Students",
+            "POST",
+            f"classes/{self.clone_class_id}/students/move",
+            200,
+            data={"target_class_id": self.class_id, "student_ids": [self.copied_student_id]}
+        )
+        return success and [student['id'] for student in response] == [self.copied_student_id]
+
+    def test_snapshot(self):
+        """Test exporting a class snapshot and importing it as a new class"""
+        if not self.class_id:
+            print("❌ No class ID available for testing")
+            return False
+        
+        self.tests_run += 1
+        print("\n🔍 Testing Export Snapshot...")
+        response = requests.get(
+            f"{self.base_url}/classes/{self.class_id}/snapshot",
+            headers={'Authorization': f'Bearer {self.token}'}
+        )
+        if response.status_code != 200:
+            print(f"❌ Failed - Expected 200, got {response.status_code}")
+            return False
+        lines = gzip.decompress(response.content).splitlines()
+        if json.loads(lines[0]).get('type') != 'header' or json.loads(lines[-1]).get('type') != 'end':
+            print("❌ Failed - Snapshot is incomplete")
+            return False
+        self.tests_passed += 1
+        print(f"✅ Passed - Status: {response.status_code}")
+        
+        success, imported = self.run_test(
+            "Import Snapshot",
+            "POST",
+            "snapshots?name=Imported%20Class",
+            200,
+            files={'file': ('snapshot.jsonl.gz', response.content, 'application/gzip')}
+        )
+        if not success:
+            return False
+        # Clean up the imported class
+        self.run_test(
+            "Delete Imported Class",
+            "DELETE",
+            f"classes/{imported['class']['id']}",
+            200
+        )
+        return imported['class']['id'] != self.class_id and imported['students'] > 0
+
     def test_delete_all_students(self):
         """Test deleting all students in a class"""
         if not self.class_id:
@@ -310,6 +682,11 @@ def main():
     # Setup
     tester = StudentParticipationAPITester()
     
+    # Test the backend is up and reaches its database
+    if not tester.test_health():
+        print("❌ Backend is not ready, stopping tests")
+        return 1
+
     # Test teacher registration
     password = "Password123!"
     success, email = tester.test_register()
@@ -349,11 +726,31 @@ def main():
         print("❌ Uploading students failed")
         return 1
 
+    # Test uploading students as a compressed file
+    if not tester.test_upload_students_file():
+        print("❌ Uploading students file failed")
+        return 1
+
     # Test getting students
     if not tester.test_get_students():
         print("❌ Getting students failed")
         return 1
 
+    # Test filtering the roster
+    if not tester.test_filter_students():
+        print("❌ Filtering students failed")
+        return 1
+
+    # Test requesting a sparse roster
+    if not tester.test_sparse_students():
+        print("❌ Sparse students failed")
+        return 1
+
+    # Test searching students across classes
+    if not tester.test_search_students():
+        print("❌ Searching students failed")
+        return 1
+
     # Test getting a random student
     if not tester.test_get_random_student():
         print("❌ Getting random student failed")
@@ -374,11 +771,71 @@ def main():
         print("❌ Getting assessments failed")
         return 1
 
+    # Test ordering the roster by participation
+    if not tester.test_sort_by_participation():
+        print("❌ Sorting students by participation failed")
+        return 1
+
     # Test getting statistics
     if not tester.test_get_statistics():
         print("❌ Getting statistics failed")
         return 1
 
+    # Test getting the class overview
+    if not tester.test_get_overview():
+        print("❌ Getting overview failed")
+        return 1
+
+    # Test batching requests
+    if not tester.test_batch():
+        print("❌ Batch requests failed")
+        return 1
+
+    # Test getting incremental changes
+    if not tester.test_get_changes():
+        print("❌ Getting changes failed")
+        return 1
+
+    # Test fetching the delta straight after each change
+    if not tester.test_changes_round_trip():
+        print("❌ Changes round trip failed")
+        return 1
+
+    # Test getting the leaderboard
+    if not tester.test_get_leaderboard():
+        print("❌ Getting leaderboard failed")
+        return 1
+
+    # Test getting analytics
+    if not tester.test_get_analytics():
+        print("❌ Getting analytics failed")
+        return 1
+
+    # Test the live session WebSocket
+    if not tester.test_live_session():
+        print("❌ Live session failed")
+        return 1
+
+    # Test cloning the class
+    if not tester.test_clone_class():
+        print("❌ Cloning class failed")
+        return 1
+
+    # Test copying a student into the clone
+    if not tester.test_copy_students():
+        print("❌ Copying students failed")
+        return 1
+
+    # Test moving the copy back
+    if not tester.test_move_students():
+        print("❌ Moving students failed")
+        return 1
+
+    # Test exporting and importing a snapshot
+    if not tester.test_snapshot():
+        print("❌ Snapshot export and import failed")
+        return 1
+
     # Test deleting all students
     if not tester.test_delete_all_students():
         print("❌ Deleting all students failed")
@@ -4,18 +4,41 @@ set -e
 # Start the FastAPI backend
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
-echo "Starting FastAPI backend"
+# Worker processes. Each keeps its own caches, so more than one needs
+# INVALIDATION_REDIS_URL for workers to see each other's writes, and
+# PROFILING_TOKEN for a profiling token that every worker accepts. Profiles,
+# memory snapshots and the slow query log stay per worker
+WORKERS=${WEB_CONCURRENCY:-1}
+if [ "$WORKERS" -gt 1 ] && [ "${STORAGE_BACKEND:-mongo}" = "memory" ]; then
+    echo "STORAGE_BACKEND=memory keeps a separate database per worker, set WEB_CONCURRENCY=1"
+    exit 1
+fi
+if [ "$WORKERS" -gt 1 ] && [ -z "$INVALIDATION_REDIS_URL" ]; then
+    echo "Warning: $WORKERS workers without INVALIDATION_REDIS_URL can serve stale reads"
+fi
+
+echo "Starting FastAPI backend with $WORKERS worker(s)"
 # Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+uvicorn server:app --host 0.0.0.0 --port 8001 --workers "$WORKERS" &
 BACKEND_PID=$!
 
-echo "Waiting for backend to start..."
-sleep 30
-
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Backend failed to start at initialization, exiting"
-    exit 1
-fi
+echo "Waiting for backend to become ready..."
+READY_WAIT=${BACKEND_READY_WAIT:-120}
+waited=0
+until wget -q -T 2 -O /dev/null http://127.0.0.1:8001/api/readyz 2>/dev/null; do
+    if ! kill -0 $BACKEND_PID 2>/dev/null; then
+        echo "Backend failed to start at initialization, exiting"
+        exit 1
+    fi
+    if [ "$waited" -ge "$READY_WAIT" ]; then
+        echo "Backend not ready after ${READY_WAIT}s, exiting"
+        kill $BACKEND_PID
+        exit 1
+    fi
+    sleep 1
+    waited=$((waited + 1))
+done
+echo "Backend ready after ${waited}s"
 
 # Start Nginx
 nginx -g 'daemon off;' &
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import string
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import httpx
+
+STEPS = ["open_class", "pick_student", "record_score", "refresh_stats"]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    # Nearest-rank percentile
+    index = min(len(values) - 1, max(0, math.ceil(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+class StepStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.error_codes = defaultdict(int)
+
+    def record(self, latency_ms, error=None):
+        self.latencies.append(latency_ms)
+        if error is not None:
+            self.errors += 1
+            self.error_codes[str(error)] += 1
+
+    def summary(self, duration):
+        count = len(self.latencies)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "throughput_rps": round(count / duration, 2) if duration else 0.0,
+            "p50_ms": round(percentile(self.latencies, 50), 2),
+            "p90_ms": round(percentile(self.latencies, 90), 2),
+            "p95_ms": round(percentile(self.latencies, 95), 2),
+            "p99_ms": round(percentile(self.latencies, 99), 2),
+            "max_ms": round(max(self.latencies), 2) if self.latencies else 0.0,
+            "error_codes": dict(self.error_codes),
+        }
+
+
+class ClassroomLoadTest:
+    """Replay the classroom assessment workflow from many classrooms at once.
+
+    Each simulated classroom opens its class page, then loops: pick a random
+    student, record a score, refresh the statistics, with think time between
+    interactions. The requests match what the React assessment page sends.
+    """
+
+    def __init__(self, base_url, classrooms, teachers, students, duration, think_time,
+                 ramp_up, reopen_every, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.classrooms = classrooms
+        self.teachers = max(1, min(teachers, classrooms))
+        self.students = students
+        self.duration = duration
+        self.think_time = think_time
+        self.ramp_up = ramp_up
+        self.reopen_every = reopen_every
+        self.timeout = timeout
+        self.stats = {step: StepStats() for step in STEPS}
+        self.tokens = []
+        self.class_ids = []
+
+    async def timed(self, step, requests):
+        # A step may fan out into several concurrent requests, as the page does
+        start = time.perf_counter()
+        error = None
+        responses = []
+        try:
+            responses = await asyncio.gather(*requests)
+            for response in responses:
+                if response.status_code >= 400:
+                    error = response.status_code
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        self.stats[step].record((time.perf_counter() - start) * 1000, error)
+        return responses if error is None else None
+
+    async def setup(self, client):
+        print(f"Setting up {self.teachers} teachers and {self.classrooms} classrooms "
+              f"with {self.students} students each...")
+        password = "LoadTest123!"
+        for _ in range(self.teachers):
+            suffix = "".join(random.choices(string.ascii_lowercase + string.digits, k=10))
+            response = await client.post("/register", json={
+                "name": f"Load Teacher {suffix}",
+                "email": f"load_{suffix}@example.com",
+                "password": password,
+            })
+            response.raise_for_status()
+            self.tokens.append(response.json()["access_token"])
+
+        csv_content = "name,student_number\n" + "\n".join(
+            f"Student {i},S{i:05d}" for i in range(self.students)
+        )
+
+        async def create_classroom(index):
+            headers = self.headers(index)
+            response = await client.post("/classes", json={"name": f"Load Class {index}"}, headers=headers)
+            response.raise_for_status()
+            class_id = response.json()["id"]
+            response = await client.post(
+                f"/classes/{class_id}/students/upload", json={"content": csv_content}, headers=headers
+            )
+            response.raise_for_status()
+            return class_id
+
+        self.class_ids = await asyncio.gather(*[create_classroom(i) for i in range(self.classrooms)])
+
+    def headers(self, index):
+        return {"Authorization": f"Bearer {self.tokens[index % len(self.tokens)]}"}
+
+    async def think(self):
+        if self.think_time > 0:
+            await asyncio.sleep(random.expovariate(1 / self.think_time))
+
+    async def classroom(self, client, index, deadline):
+        # Spread classroom start times over the ramp-up period
+        await asyncio.sleep(self.ramp_up * index / self.classrooms)
+        headers = self.headers(index)
+        class_id = self.class_ids[index]
+        picks = 0
+        while time.perf_counter() < deadline:
+            if picks % self.reopen_every == 0:
+                await self.timed("open_class", [
+                    client.get(f"/classes/{class_id}", headers=headers),
+                    client.get(f"/classes/{class_id}/statistics", headers=headers),
+                ])
+                await self.think()
+
+            responses = await self.timed("pick_student", [
+                client.get(f"/classes/{class_id}/random-student", headers=headers),
+            ])
+            picks += 1
+            await self.think()
+            if responses is None or time.perf_counter() >= deadline:
+                continue
+
+            student_id = responses[0].json()["id"]
+            await self.timed("record_score", [
+                client.post(f"/classes/{class_id}/assessments", json={
+                    "student_id": student_id,
+                    "score": random.randint(0, 1),
+                }, headers=headers),
+            ])
+            await self.timed("refresh_stats", [
+                client.get(f"/classes/{class_id}/statistics", headers=headers),
+            ])
+            await self.think()
+
+    async def teardown(self, client):
+        await asyncio.gather(*[
+            client.delete(f"/classes/{class_id}", headers=self.headers(index))
+            for index, class_id in enumerate(self.class_ids)
+        ])
+
+    async def run(self, keep=False):
+        limits = httpx.Limits(max_connections=self.classrooms * 2, max_keepalive_connections=self.classrooms * 2)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits) as client:
+            await self.setup(client)
+            print(f"Running for {self.duration}s ({self.ramp_up}s ramp-up, {self.think_time}s mean think time)...")
+            start = time.perf_counter()
+            deadline = start + self.duration
+            await asyncio.gather(*[
+                self.classroom(client, index, deadline) for index in range(self.classrooms)
+            ])
+            elapsed = time.perf_counter() - start
+            if not keep:
+                await self.teardown(client)
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        steps = {step: self.stats[step].summary(elapsed) for step in STEPS}
+        total = sum(step["requests"] for step in steps.values())
+        errors = sum(step["errors"] for step in steps.values())
+        return {
+            "finished_at": datetime.utcnow().isoformat(),
+            "classrooms": self.classrooms,
+            "students_per_class": self.students,
+            "duration_s": round(elapsed, 2),
+            "steps_per_second": round(total / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "steps": steps,
+        }
+
+
+def print_report(report):
+    print(f"\n📊 {report['classrooms']} classrooms, {report['duration_s']}s, "
+          f"{report['steps_per_second']} steps/s, error rate {report['error_rate']:.2%}")
+    header = f"{'step':<15}{'count':>8}{'err%':>8}{'rps':>9}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print("-" * len(header))
+    for step, summary in report["steps"].items():
+        print(f"{step:<15}{summary['requests']:>8}{summary['error_rate']:>8.2%}{summary['throughput_rps']:>9.1f}"
+              f"{summary['p50_ms']:>9.1f}{summary['p90_ms']:>9.1f}{summary['p95_ms']:>9.1f}"
+              f"{summary['p99_ms']:>9.1f}{summary['max_ms']:>9.1f}")
+        if summary["error_codes"]:
+            print(f"{'':<15}errors: {summary['error_codes']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classroom-session load test")
+    parser.add_argument("--base-url", default="http://localhost:8001/api")
+    parser.add_argument("--classrooms", type=int, default=100, help="concurrent classrooms")
+    parser.add_argument("--teachers", type=int, default=10, help="teachers sharing the classrooms")
+    parser.add_argument("--students", type=int, default=30, help="students per classroom")
+    parser.add_argument("--duration", type=float, default=60, help="measured run time in seconds")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean pause between interactions")
+    parser.add_argument("--ramp-up", type=float, default=10, help="seconds to start all classrooms")
+    parser.add_argument("--reopen-every", type=int, default=20, help="picks before the class page is reopened")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    parser.add_argument("--keep", action="store_true", help="do not delete the classes afterwards")
+    args = parser.parse_args()
+
+    test = ClassroomLoadTest(
+        base_url=args.base_url,
+        classrooms=args.classrooms,
+        teachers=args.teachers,
+        students=args.students,
+        duration=args.duration,
+        think_time=args.think_time,
+        ramp_up=args.ramp_up,
+        reopen_every=max(1, args.reopen_every),
+        timeout=args.timeout,
+    )
+    report = asyncio.run(test.run(keep=args.keep))
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["error_rate"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
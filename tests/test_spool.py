@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from spool import DurableSpool  # noqa: E402
+
+
+def write_orphan(directory, lines):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "journal-1-dead.jsonl")
+    with open(path, "wb") as f:
+        f.write(b"".join(lines))
+    return path
+
+
+async def replay_until(spool, done):
+    await spool.start()
+    for _ in range(200):
+        if done():
+            break
+        await asyncio.sleep(0.01)
+    await spool.close()
+
+
+def test_replay_skips_undecodable_line(tmp_path):
+    directory = str(tmp_path / "spool")
+    path = write_orphan(directory, [
+        json.dumps({"id": "a"}).encode() + b"\n",
+        b"{not json\n",
+        json.dumps({"id": "b"}).encode() + b"\n",
+    ])
+    replayed = []
+
+    async def replay(docs):
+        replayed.extend(doc["id"] for doc in docs)
+
+    spool = DurableSpool(directory, replay, poll_interval=0.01)
+    asyncio.run(replay_until(spool, lambda: spool.recovered_journals))
+
+    assert replayed == ["a", "b"]
+    assert spool.rejected == 1
+    with open(f"{path}.rejected", "rb") as f:
+        assert f.read() == b"{not json\n"
+    assert not os.path.exists(path)
+
+
+def test_replay_sets_aside_entry_that_keeps_failing(tmp_path):
+    directory = str(tmp_path / "spool")
+    path = write_orphan(directory, [
+        json.dumps({"id": doc_id}).encode() + b"\n" for doc_id in ("a", "poison", "b")
+    ])
+    replayed = []
+
+    async def replay(docs):
+        if any(doc["id"] == "poison" for doc in docs):
+            raise RuntimeError("rejected by the database")
+        replayed.extend(doc["id"] for doc in docs)
+
+    spool = DurableSpool(directory, replay, poll_interval=0.001, max_backoff=0.001, max_attempts=3)
+    asyncio.run(replay_until(spool, lambda: spool.recovered_journals))
+
+    assert replayed == ["a", "b"]
+    assert spool.rejected == 1
+    with open(f"{path}.rejected", "rb") as f:
+        assert json.loads(f.read()) == {"id": "poison"}
+
+
+def test_replay_keeps_running_after_bad_line(tmp_path):
+    directory = str(tmp_path / "spool")
+    replayed = []
+
+    async def replay(docs):
+        replayed.extend(doc["id"] for doc in docs)
+
+    async def run():
+        spool = DurableSpool(directory, replay, poll_interval=0.01)
+        await spool.start()
+        await asyncio.to_thread(spool.journal.append, b"[1, 2]\n")
+        await spool.append({"id": "after"})
+        for _ in range(200):
+            if replayed:
+                break
+            await asyncio.sleep(0.01)
+        await spool.close()
+        return spool
+
+    spool = asyncio.run(run())
+
+    assert replayed == ["after"]
+    assert spool.rejected == 1
+    assert spool.last_error is None